@@ -28,12 +28,143 @@ def alter_tokens(db: Session):
         raise
 
 
+def add_doc_chunk_indexes(db: Session):
+    """Composite indexes for training's bulk dedup, doc link prefetch and chat history"""
+    try:
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_doc_chunks_bot_hash
+            ON chatbot_doc_chunks (bot_id, content_hash)
+        """))
+
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_doc_links_bot_parent
+            ON chat_bots_doc_links (bot_id, parent_link_id)
+        """))
+
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_chat_messages_chat_created
+            ON chat_messages (chat_id, created_at)
+        """))
+
+        print("✅ Indexes added to chatbot_doc_chunks, chat_bots_doc_links and chat_messages.")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error adding indexes: {e}")
+        raise
+
+
+def add_answer_cache_columns(db: Session):
+    """Knowledge version keying the answer cache, and per-reply cache accounting"""
+    try:
+        db.execute(text("""
+            ALTER TABLE chat_bots
+            ADD COLUMN IF NOT EXISTS knowledge_version INTEGER NOT NULL DEFAULT 0
+        """))
+
+        db.execute(text("""
+            ALTER TABLE chat_messages
+            ADD COLUMN IF NOT EXISTS from_cache BOOLEAN NOT NULL DEFAULT 0
+        """))
+
+        db.execute(text("""
+            ALTER TABLE chat_messages
+            ADD COLUMN IF NOT EXISTS tokens_saved INTEGER NOT NULL DEFAULT 0
+        """))
+
+        print("✅ Answer cache columns added to chat_bots and chat_messages.")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error adding answer cache columns: {e}")
+        raise
+
+
+def add_char_usage_ledger(db: Session):
+    """Per-user character ledger (utils.char_ledger), backfilled for existing users"""
+    try:
+        db.execute(text("""
+            CREATE TABLE IF NOT EXISTS user_char_usage (
+                user_id INTEGER NOT NULL PRIMARY KEY,
+                chunk_chars INTEGER NOT NULL DEFAULT 0,
+                text_content_chars INTEGER NOT NULL DEFAULT 0,
+                faq_chars INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        """))
+
+        db.execute(text("""
+            INSERT INTO user_char_usage
+                (user_id, chunk_chars, text_content_chars, faq_chars, updated_at)
+            SELECT
+                u.id,
+                COALESCE((
+                    SELECT SUM(COALESCE(c.char_count, CHAR_LENGTH(c.content)))
+                    FROM chatbot_doc_chunks c
+                    WHERE c.user_id = u.id
+                ), 0),
+                COALESCE((
+                    SELECT SUM(CHAR_LENGTH(TRIM(b.text_content)))
+                    FROM chat_bots b
+                    WHERE b.user_id = u.id
+                ), 0),
+                COALESCE((
+                    SELECT SUM(
+                        COALESCE(CHAR_LENGTH(TRIM(f.question)), 0)
+                        + COALESCE(CHAR_LENGTH(TRIM(f.answer)), 0)
+                    )
+                    FROM chat_bots_faqs f
+                    JOIN chat_bots b ON b.id = f.bot_id
+                    WHERE b.user_id = u.id
+                ), 0),
+                NOW()
+            FROM users u
+            WHERE NOT EXISTS (
+                SELECT 1 FROM user_char_usage l WHERE l.user_id = u.id
+            )
+        """))
+
+        print("✅ user_char_usage created and backfilled.")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error creating user_char_usage: {e}")
+        raise
+
+
+def run_step(db: Session, step):
+    """
+    Run one migration step in its own transaction.
+
+    Steps are independent: one that fails (e.g. the token column rename on a
+    database that already has it) is rolled back and logged without keeping
+    the later steps from being applied.
+    """
+    try:
+        step(db)
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        print(f"[WARN] Migration step {step.__name__} failed, continuing with the next step")
+        return False
+
+
 def main():
     db: Session = SessionLocal()
     try:
-        alter_tokens(db)
-        db.commit()
-        print("✅ All changes committed successfully.")
+        steps = [
+            alter_tokens,
+            add_doc_chunk_indexes,
+            add_answer_cache_columns,
+            add_char_usage_ledger,
+        ]
+        failed = [step.__name__ for step in steps if not run_step(db, step)]
+        if failed:
+            print(f"❌ Steps not applied: {', '.join(failed)}")
+        else:
+            print("✅ All changes committed successfully.")
     finally:
         db.close()
 
@@ -61,6 +61,64 @@ class Settings:
     ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
     BASE_URL = os.getenv("BASE_URL")
 
+    # Optional shared cache tier; in-process caches are used when unset
+    REDIS_URL = os.getenv("REDIS_URL")
+    BOT_SNAPSHOT_TTL = int(os.getenv("BOT_SNAPSHOT_TTL", "300"))
+    ADMIN_SETTINGS_TTL = int(os.getenv("ADMIN_SETTINGS_TTL", "60"))
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+    QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+    NAMESPACE_STATS_TTL = int(os.getenv("NAMESPACE_STATS_TTL", "60"))
+    CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CHUNK_CACHE_TTL = int(os.getenv("CHUNK_CACHE_TTL", "86400"))
+    # Should be storage shared by the API and Celery hosts; otherwise each host
+    # rebuilds a bot's index from the DB when it no longer matches the chunk count
+    LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_indexes")
+    # Vector backend: "pinecone" or "local" (memory-mapped NumPy files, no network)
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
+    PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "yashraa-ai")
+    LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "vector_store")
+    # Bots with at most this many chunks are searched in-process (0 disables)
+    SMALL_BOT_MAX_CHUNKS = int(os.getenv("SMALL_BOT_MAX_CHUNKS", "5000"))
+    IN_PROCESS_VECTORS_MAX_BYTES = int(
+        os.getenv("IN_PROCESS_VECTORS_MAX_BYTES", str(512 * 1024 * 1024))
+    )
+    # In-process copies are rebuilt once this many seconds old, which picks up
+    # writes missed by the version check (no REDIS_URL, lagging remote listing)
+    IN_PROCESS_VECTORS_TTL = int(os.getenv("IN_PROCESS_VECTORS_TTL", "60"))
+    # Score fusion: "weighted" (max-normalized vector/BM25 blend) or "rrf"
+    RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "weighted")
+    RETRIEVAL_VECTOR_WEIGHT = float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "0.7"))
+    RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+    MMR_DUPLICATE_THRESHOLD = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.85"))
+    # Training-time embedding; batch size 0 means the provider default
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "0"))
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+    EMBEDDING_RETRY_MAX_DELAY = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY", "30"))
+    UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+    # Parsed text of uploaded files, keyed by file sha256
+    PARSED_DOC_CACHE_DIR = os.getenv("PARSED_DOC_CACHE_DIR", "parsed_docs")
+    PARSED_DOC_CACHE_MAX_BYTES = int(
+        os.getenv("PARSED_DOC_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))
+    )
+    # Semantic answer cache: reuse a bot's answer for queries this close (cosine)
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    # Answers kept per bot and knowledge version (0 disables the cache)
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+    ANSWER_CACHE_MAX_BOTS = int(os.getenv("ANSWER_CACHE_MAX_BOTS", "1024"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    # Prompt input tokens per request (capped by the model's context window)
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+    PROMPT_OUTPUT_RESERVE = int(os.getenv("PROMPT_OUTPUT_RESERVE", "2048"))
+    # Per-session recent message buffer used as prompt history
+    CHAT_HISTORY_CACHE_SIZE = int(os.getenv("CHAT_HISTORY_CACHE_SIZE", "20000"))
+    CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", "3600"))
+    # Share of the budget the bot's text_content and instruction prompts may use
+    PROMPT_INSTRUCTIONS_SHARE = float(os.getenv("PROMPT_INSTRUCTIONS_SHARE", "0.5"))
+    # Section priority when context chunks and history of equal rank compete
+    PROMPT_PACK_ORDER = os.getenv("PROMPT_PACK_ORDER", "context,history")
+
 
 settings = Settings()
 
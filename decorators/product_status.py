@@ -1,9 +1,8 @@
 from functools import wraps
-from sqlalchemy import func
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from models.adminModel.productModel import Product
 from sqlalchemy.orm import Session
+from utils.admin_settings import get_product_status
 import inspect
 
 
@@ -18,8 +17,7 @@ def check_product_status(product: str):
                     raise HTTPException(status_code=500, detail="Database session not available")
                 
                 # Get token from cookies
-                is_active = db.query(Product).filter(func.lower(Product.name) == func.lower(product)).first()
-                if is_active.status == "deactive":
+                if get_product_status(db, product) == "deactive":
                     raise HTTPException(
                         status_code=403,
                         detail=f"Product is not active"
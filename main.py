@@ -33,6 +33,7 @@ from routes.admin.tokensAndCredits import router as token_credits_router
 from routes.subscriptions.failed_payment import router as failed_payment
 from routes.admin.enterprise import router as enterprise_users
 from models.downgradeModel.downgradeModel import DowngradeSelections
+from routes.chat.pinecone import warm_up_clients
 
 app = FastAPI()
 # init_orm_db()
@@ -51,6 +52,9 @@ app.add_middleware(
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Build the shared LLM / embedding clients before the first request
+app.add_event_handler("startup", warm_up_clients)
+
         
 
 @app.get("/")
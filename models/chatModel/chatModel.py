@@ -8,6 +8,8 @@ from sqlalchemy import (
     Text,
     Enum,
     TIMESTAMP,
+    Index,
+    LargeBinary,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -35,9 +37,16 @@ class ChatMessage(Base):
     bot_id = Column(Integer, nullable=False)
     sender = Column(Enum("user", "bot", name="sender_enum"))
     message = Column(Text)
+    # Bot replies served from the semantic answer cache, and the LLM tokens that saved
+    from_cache = Column(Boolean, default=False, nullable=False, server_default="0")
+    tokens_saved = Column(Integer, default=0, nullable=False, server_default="0")
     created_at = Column(TIMESTAMP, server_default=func.now())
     chat_session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_chat_messages_chat_created", "chat_id", "created_at"),
+    )
+
 
 class ChatBots(Base):
     __tablename__ = "chat_bots"
@@ -57,6 +66,8 @@ class ChatBots(Base):
     lead_email = Column(String(255), nullable=True)
     limit_to = Column(Integer, nullable=True)
     every_minutes = Column(Integer, nullable=True)
+    # Bumped on training, FAQ, tuning or text_content changes; keys the answer cache
+    knowledge_version = Column(Integer, default=0, nullable=False, server_default="0")
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, onupdate=func.now())
 
@@ -130,6 +141,10 @@ class ChatBotsDocLinks(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_doc_links_bot_parent", "bot_id", "parent_link_id"),
+    )
+
 
 class ChatBotsDocChunks(Base):
     __tablename__ = "chatbot_doc_chunks"
@@ -149,6 +164,21 @@ class ChatBotsDocChunks(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_doc_chunks_bot_hash", "bot_id", "content_hash"),
+    )
+
+
+class ChunkEmbedding(Base):
+    """Embedding of a chunk text, shared by every bot that trains the same text"""
+
+    __tablename__ = "chunk_embeddings"
+
+    embedding_space = Column(String(100), primary_key=True)  # tool:model:projection version
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the chunk text
+    vector = Column(LargeBinary, nullable=False)  # float16 bytes
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
 
 class ChatBotLeadsModel(Base):
     __tablename__ = "chatbot_leads"
@@ -81,3 +81,19 @@ class HistoryUserCredits(Base):
     message_per_unit = Column(Integer)
     credits_consumed_messages = Column(Integer)
     credit_balance_messages = Column(Integer)
+
+
+class UserCharUsage(Base):
+    """Characters a user has trained, kept current on every write (see utils.char_ledger)"""
+
+    __tablename__ = "user_char_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    chunk_chars = Column(Integer, nullable=False, default=0)
+    text_content_chars = Column(Integer, nullable=False, default=0)
+    faq_chars = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    @property
+    def total_chars(self) -> int:
+        return self.chunk_chars + self.text_content_chars + self.faq_chars
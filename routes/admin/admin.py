@@ -20,6 +20,7 @@ from models.subscriptions.transactionModel import Transaction
 from models.subscriptions.userCredits import HistoryUserCredits, UserCredits
 from routes.chat.pinecone import delete_documents_from_pinecone
 from utils.utils import decode_access_token, get_country_from_ip, get_current_user
+from utils.char_ledger import drop_char_usage, refresh_char_usage
 from jose import JWTError, jwt
 from uuid import uuid4
 import json
@@ -64,6 +65,13 @@ import smtplib
 from decorators.rbac_admin import check_permissions
 from decorators.public import public_route
 from decorators.allow_roles import allow_roles
+from utils.admin_settings import (
+    PAYMENT_GATEWAYS,
+    SUBSCRIPTION_PLANS,
+    get_payment_gateways,
+    get_subscription_plans,
+    invalidate_admin_settings,
+)
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -394,6 +402,9 @@ async def process_downgrade_after_payment(
                     import traceback
                     traceback.print_exc()
 
+        if processed_items["chatbots_deleted"]:
+            refresh_char_usage(db, user_id)
+
         # Update selection status
         selection.status = "processed"
         selection.updated_at = datetime.utcnow()
@@ -772,6 +783,7 @@ async def create_subscription_plans(
 
             db.commit()
             db.refresh(existing_plan)
+            invalidate_admin_settings(SUBSCRIPTION_PLANS)
             return existing_plan
         else:
             token_per_unit = data.token_per_unit or 1000
@@ -793,6 +805,7 @@ async def create_subscription_plans(
             db.add(new_plan)
             db.commit()
             db.refresh(new_plan)
+            invalidate_admin_settings(SUBSCRIPTION_PLANS)
 
             # TODO: add activity log entry
             return new_plan
@@ -814,6 +827,7 @@ async def update_plan_status(
     plan.is_active = is_active
     db.commit()
     db.refresh(plan)
+    invalidate_admin_settings(SUBSCRIPTION_PLANS)
 
     return {
         "success": True,
@@ -873,13 +887,11 @@ async def get_all_subscription_plans_public(
     request: Request, db: Session = Depends(get_db)
 ):
     try:
-        plans = (
-            db.query(SubscriptionPlans)
-            .filter(
-                SubscriptionPlans.is_active == True, SubscriptionPlans.is_trial == False
-            )
-            .all()
-        )
+        plans = [
+            plan
+            for plan in get_subscription_plans(db)
+            if plan.is_active and not plan.is_trial
+        ]
 
         client_ip = request.client.host
         country = await get_country_from_ip(ip=client_ip)
@@ -944,6 +956,7 @@ async def delete_subscription_plan(
         if plan:
             db.delete(plan)
             db.commit()
+            invalidate_admin_settings(SUBSCRIPTION_PLANS)
         return {"message": "Plan deleted successfully"}
     except HTTPException as http_exc:
         raise http_exc
@@ -1805,6 +1818,7 @@ async def delete_admin_user(
             ).delete()
 
             chatbots_query.delete()
+            drop_char_usage(db, adminUser.id)
 
             db.delete(adminUser)
             db.commit()
@@ -1928,6 +1942,7 @@ async def create_update_payment_gateway(
 
             db.commit()
             db.refresh(existing_payment)
+            invalidate_admin_settings(PAYMENT_GATEWAYS)
             return existing_payment
         else:
             new_payment_gateway = PaymentGateway(
@@ -1936,6 +1951,7 @@ async def create_update_payment_gateway(
             db.add(new_payment_gateway)
             db.commit()
             db.refresh(new_payment_gateway)
+            invalidate_admin_settings(PAYMENT_GATEWAYS)
             return new_payment_gateway
 
     except HTTPException as http_exc:
@@ -1951,8 +1967,7 @@ async def get_payments_gateway(request: Request, db: Session = Depends(get_db)):
         token = request.cookies.get("access_token")
         payload = decode_access_token(token)
         user_id = int(payload.get("user_id"))
-        payments_gateway = db.query(PaymentGateway).filter()
-        return payments_gateway
+        return get_payment_gateways(db)
 
     except HTTPException as http_exc:
         raise http_exc
@@ -1975,6 +1990,7 @@ async def delete_payments_gateway(
         if payment_gateway:
             db.delete(payment_gateway)
             db.commit()
+            invalidate_admin_settings(PAYMENT_GATEWAYS)
         return {"message": "Payment gateway deleted successfully!"}
 
     except HTTPException as http_exc:
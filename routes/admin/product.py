@@ -6,6 +6,7 @@ from decorators.public import public_route
 from decorators.rbac_admin import check_permissions
 from models.adminModel.productModel import Product,ProductStatusUpdate
 from pydantic import BaseModel
+from utils.admin_settings import PRODUCTS, invalidate_admin_settings
 
 router = APIRouter()
 @router.get("/products")
@@ -50,6 +51,7 @@ async def update_product_status(
         product.status = status_update.status
         db.commit()
         db.refresh(product)
+        invalidate_admin_settings(PRODUCTS)
 
         return {
             "success": True,
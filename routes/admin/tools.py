@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Body, Request
 from sqlalchemy.orm import Session
 from config import get_db
@@ -5,6 +6,11 @@ from sqlalchemy.exc import SQLAlchemyError
 from decorators.rbac_admin import check_permissions
 from models.adminModel.toolsModal import ToolsUsed, ToolStatusUpdate
 from pydantic import BaseModel
+from utils.admin_settings import ACTIVE_TOOL, invalidate_admin_settings
+from routes.chat.pinecone import get_namespace_stats
+from utils.vector_store import get_vector_store
+from utils.cache import cache_stats
+from utils.metrics import counter_stats, latency_stats
 
 router = APIRouter()
 
@@ -52,6 +58,7 @@ async def tool_status(
         tool.status = tool_status.status
         db.commit()
         db.refresh(tool)
+        invalidate_admin_settings(ACTIVE_TOOL)
 
         return {
             "success": True,
@@ -68,3 +75,42 @@ async def tool_status(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Something went wrong: {str(e)}")
+
+
+@router.get("/cache-stats")
+@check_permissions(["product-monitoring"])
+async def get_cache_stats(request: Request, db: Session = Depends(get_db)):
+    """Hit rates of the in-process caches of the worker serving this request"""
+    return {
+        "success": True,
+        "message": "Cache stats fetched successfully.",
+        "data": cache_stats(),
+    }
+
+
+@router.get("/vector-stats")
+@check_permissions(["product-monitoring"])
+async def get_vector_stats(
+    request: Request, refresh: bool = False, db: Session = Depends(get_db)
+):
+    """Vector counts per bot namespace, retrieval latency percentiles and dedup savings"""
+    try:
+        namespace_stats = await asyncio.to_thread(get_namespace_stats, refresh)
+        vector_store = get_vector_store()
+        return {
+            "success": True,
+            "message": "Vector stats fetched successfully.",
+            "data": {
+                "index": namespace_stats,
+                "backend": vector_store.name,
+                "tiers": (
+                    vector_store.tier_stats()
+                    if hasattr(vector_store, "tier_stats")
+                    else None
+                ),
+                "latency": latency_stats(),
+                "counters": counter_stats(),
+            },
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {str(e)}")
@@ -13,7 +13,8 @@ from fastapi.responses import JSONResponse
 from passlib.context import CryptContext
 from models.chatModel.tuning import DBInstructionPrompt
 from routes.chat.pinecone import delete_documents_from_pinecone
-from models.adminModel.adminModel import SubscriptionPlans
+from utils.admin_settings import get_subscription_plans
+from utils.char_ledger import drop_char_usage
 from models.authModel.authModel import AuthUser
 from models.chatModel.sharing import ChatBotSharing
 from models.chatModel.chatModel import ChatBots, ChatSession
@@ -259,13 +260,11 @@ async def get_subscription_plans_authenticated(
     db: Session = Depends(get_db),
 ):
     try:
-        plans = (
-            db.query(SubscriptionPlans)
-            .filter(
-                SubscriptionPlans.is_active == True, SubscriptionPlans.is_trial == False
-            )
-            .all()
-        )
+        plans = [
+            plan
+            for plan in get_subscription_plans(db)
+            if plan.is_active and not plan.is_trial
+        ]
 
         client_ip = request.client.host
 
@@ -892,6 +891,7 @@ def delete_user(
     ).delete()
 
     chatbots_query.delete()
+    drop_char_usage(db, user_id)
 
     db.delete(user)  # Hard delete
     db.commit()
@@ -3,6 +3,7 @@ from models.authModel.authModel import AuthUser
 from models.chatModel.chatModel import ChatBotsDocLinks
 from routes.chat.pinecone import process_and_store_docs
 from config import Base, SessionLocal
+from utils.bot_snapshot import bump_knowledge_version
 
 celery = Celery(__name__, broker="redis://localhost:6379/0")
 
@@ -44,6 +45,7 @@ def process_document_task(doc_id: int):
         doc_entry.chars = chars_count
         db.commit()
         print(f"[DEBUG] Updated status to 'trained' and saved char count")
+        bump_knowledge_version(db, doc_entry.bot_id)
 
     except Exception as e:
         print(f"[ERROR] Exception during document processing: {e}")
@@ -51,6 +53,8 @@ def process_document_task(doc_id: int):
         if doc_entry:
             doc_entry.status = "failed"
             db.commit()
+            # Chunks stored before the failure are already searchable
+            bump_knowledge_version(db, doc_entry.bot_id)
         raise e
 
     finally:
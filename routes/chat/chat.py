@@ -1,3 +1,4 @@
+import asyncio
 import re
 from types import SimpleNamespace
 from fastapi import (
@@ -10,9 +11,7 @@ from fastapi import (
     Query,
 )
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
-import tiktoken
-from models.adminModel.toolsModal import ToolsUsed
+from fastapi.responses import JSONResponse, StreamingResponse
 from models.chatModel.integrations import WhatsAppUser, ZapierIntegration
 from models.subscriptions.token_usage import TokenUsage, TokenUsageHistory
 from models.subscriptions.userCredits import UserCredits
@@ -28,7 +27,8 @@ from schemas.chatSchema.tokensSchema import (
 )
 from utils.utils import (
     decode_access_token,
-    get_recent_chat_history,
+    generate_chatbot_reply,
+    stream_chatbot_reply,
     validate_response,
     handle_invalid_response,
 )
@@ -38,8 +38,6 @@ from models.chatModel.chatModel import (
     ChatSession,
     ChatMessage,
     ChatBots,
-    ChatBotsFaqs,
-    ChatBotsDocLinks,
 )
 from models.chatModel.sharing import ChatBotSharing
 from schemas.chatSchema.chatSchema import (
@@ -48,21 +46,20 @@ from schemas.chatSchema.chatSchema import (
     CreateBot,
 )
 from models.chatModel.appearance import ChatSettings
-from models.chatModel.tuning import DBInstructionPrompt
 from sqlalchemy.orm import Session
-from config import get_db
+from config import SessionLocal, get_db
 import os
-from routes.chat.pinecone import (
-    get_response_from_faqs,
-    hybrid_retrieval,
-    generate_response,
-    delete_documents_from_pinecone,
-)
-from sqlalchemy import func, and_
+from routes.chat.pinecone import delete_documents_from_pinecone
+from sqlalchemy import and_
 from decorators.product_status import check_product_status
+from utils.bot_snapshot import get_bot_snapshot
+from utils.char_ledger import get_char_usage
+from utils.chat_history import append_chat_history, drop_chat_history, history_entry
+from utils.tokenCounter import count_tokens
 import secrets
 import string
 from datetime import datetime, time
+from time import perf_counter
 from models.authModel.authModel import AuthUser
 from email.utils import formataddr
 from models.supportTickets.models import SupportTicket, Status
@@ -401,6 +398,112 @@ async def create_chat_token_session(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _verify_chat_request(db: Session, bot_id: int, chat_id: int, user_id):
+    chatbot = get_bot_snapshot(db, bot_id)
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="ChatBot not found")
+    check_rate_limit(bot_id=bot_id, user_id=user_id, db=db, chatbot=chatbot)
+    print("verify Token Limit")
+    # Verify Message limit
+    # Live read: consumption changes with every message, so it is not in the snapshot
+    token_limit_available, message = verify_token_limit_available(
+        bot_id=bot_id, db=db
+    )
+    if not token_limit_available:
+        raise HTTPException(
+            status_code=400, detail=f"Message limit exceeded: {message}"
+        )
+
+    # Verify chat session
+    chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return chatbot, chat
+
+
+def _save_chat_exchange(db: Session, user_id, bot_id: int, chat_id: int, user_msg: str, reply):
+    response_content = reply.response_content
+
+    # Save user and bot messages
+    user_message = ChatMessage(
+        user_id=user_id,
+        bot_id=bot_id,
+        chat_id=chat_id,
+        sender="user",
+        message=user_msg,
+    )
+    bot_message = ChatMessage(
+        user_id=user_id,
+        bot_id=bot_id,
+        chat_id=chat_id,
+        sender="bot",
+        message=response_content,
+        from_cache=reply.from_cache,
+        tokens_saved=reply.tokens_saved,
+    )
+
+    db.add_all([user_message, bot_message])
+    db.commit()
+    db.refresh(bot_message)
+    # Both rows come from the same insert; the bot row's timestamp stands for both
+    append_chat_history(
+        chat_id,
+        [
+            history_entry("bot", response_content, bot_message.created_at),
+            history_entry("user", user_msg, bot_message.created_at),
+        ],
+    )
+
+    # Validate response
+    is_valid, reason = validate_response(response_content)
+    if not is_valid:
+        handle_invalid_response(
+            question=user_msg,
+            response=response_content,
+            reason=reason,
+            user_id=user_id,
+            bot_id=bot_id,
+            db=db,
+        )
+
+    # Update token usage
+    consumed_token = SimpleNamespace(
+        request_token=reply.request_tokens,
+        response_token=reply.openai_response_tokens,
+        open_ai_request_token=reply.openai_request_tokens,
+        open_ai_response_token=reply.openai_response_tokens,
+        request_message=1,
+        response_message=1,
+    )
+    update_token_usage_on_consumption(
+        consumed_token=consumed_token,
+        consumed_token_type="direct_bot",
+        bot_id=bot_id,
+        db=db,
+    )
+
+    return bot_message
+
+
+def _log_failed_chat_message(db: Session, user_id, chat_id: int, bot_id, user_msg, error_detail: str):
+    """Log failed user message as SupportTicket"""
+    if not (user_msg and bot_id):
+        return
+    try:
+        db.rollback()
+        ticket = SupportTicket(
+            user_id=user_id,
+            subject=f"ChatBot Exception (chat_id={chat_id}, bot_id={bot_id})",
+            message=f"User Message: {user_msg}\n  Error Message: {error_detail}",
+            status=Status.issue_bug,
+            # error=f"User Message: {user_msg}\nError Message: {error_detail}"
+        )
+        db.add(ticket)
+        db.commit()
+    except Exception as db_exc:
+        print("Failed to log SupportTicket:", db_exc)
+
+
 # send message
 @router.post("/chats/{chat_id}/message", response_model=ChatMessageRead)
 @check_product_status("chatbot")
@@ -424,153 +527,123 @@ async def chat_message(
         if not user_msg:
             raise HTTPException(status_code=400, detail="Message required")
         print("Geting Chatbot:", bot_id, "    :    ", token)
-        # Get chatbot
-        chatbot = db.query(ChatBots).filter(ChatBots.id == bot_id).first()
-        if not chatbot:
-            raise HTTPException(status_code=404, detail="ChatBot not found")
-        check_rate_limit(bot_id=bot_id, user_id=user_id, db=db, chatbot=chatbot)
-        print("verify Token Limit")
-        # Verify Message limit
-        token_limit_available, message = verify_token_limit_available(
-            bot_id=bot_id, db=db
+        # Verify chatbot, rate/message limits and chat session
+        chatbot, chat = await asyncio.to_thread(
+            _verify_chat_request, db, bot_id, chat_id, user_id
         )
-        if not token_limit_available:
-            raise HTTPException(
-                status_code=400, detail=f"Message limit exceeded: {message}"
-            )
 
-        # Verify chat session
-        chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
+        reply = await generate_chatbot_reply(
+            db=db, chatbot=chatbot, chat_id=chat_id, user_msg=user_msg
+        )
 
-        message_history = get_recent_chat_history(chat_id=chat_id, db=db)
-        response_from_faqs = get_response_from_faqs(user_msg, bot_id, db)
-        response_content = response_from_faqs.answer if response_from_faqs else None
+        return await asyncio.to_thread(
+            _save_chat_exchange, db, user_id, bot_id, chat_id, user_msg, reply
+        )
 
-        active_tool = db.query(ToolsUsed).filter_by(status=True).first()
+    except Exception as e:
+        _log_failed_chat_message(db, user_id, chat_id, bot_id, user_msg, str(e))
 
-        if not response_content:
-            # Hybrid retrieval
-            context_texts, scores = hybrid_retrieval(
-                query=user_msg, bot_id=bot_id, db=db, tool=active_tool
-            )
+        # Raise HTTP error
+        raise HTTPException(status_code=500, detail=str(e))
 
-            instruction_prompts = (
-                db.query(DBInstructionPrompt)
-                .filter(DBInstructionPrompt.bot_id == bot_id)
-                .all()
-            )
-            dict_ins_prompt = [
-                {prompt.type: prompt.prompt} for prompt in instruction_prompts
-            ]
 
-            creativity = chatbot.creativity
-            text_content = chatbot.text_content
 
-            if len(scores) > 0:
-                # OpenAI with context
-                generated_res = generate_response(
-                    user_msg,
-                    context=context_texts[:3],
-                    use_openai=True,
-                    instruction_prompts=dict_ins_prompt,
-                    creativity=creativity,
-                    text_content=text_content,
-                    message_history=message_history,
-                    active_tool=active_tool,
-                )
-            else:
-                # Full OpenAI fallback
-                generated_res = generate_response(
-                    query=user_msg,
-                    context=[],
-                    use_openai=True,
-                    instruction_prompts=dict_ins_prompt,
-                    creativity=creativity,
-                    text_content=text_content,
-                    active_tool=active_tool,
-                    message_history=message_history,
-                )
 
-            response_content = generated_res[0]
-            request_tokens = generated_res[3] if len(generated_res) > 3 else 0
-            openai_request_tokens = generated_res[1] if len(generated_res) > 1 else 0
-            openai_response_tokens = generated_res[2] if len(generated_res) > 2 else 0
-        else:
-            request_tokens = openai_request_tokens = openai_response_tokens = 0
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-        # Save user and bot messages
-        user_message = ChatMessage(
-            user_id=user_id,
-            bot_id=bot_id,
-            chat_id=chat_id,
-            sender="user",
-            message=user_msg,
-        )
-        bot_message = ChatMessage(
-            user_id=user_id,
-            bot_id=bot_id,
-            chat_id=chat_id,
-            sender="bot",
-            message=response_content,
-        )
 
-        db.add_all([user_message, bot_message])
-        db.commit()
-        db.refresh(bot_message)
-
-        # Validate response
-        is_valid, reason = validate_response(response_content)
-        if not is_valid:
-            response_content = handle_invalid_response(
-                question=user_msg,
-                response=response_content,
-                reason=reason,
-                user_id=user_id,
-                bot_id=bot_id,
-                db=db,
-            )
+# send message, streaming the reply as Server-Sent Events
+@router.post("/chats/{chat_id}/message/stream")
+@check_product_status("chatbot")
+async def chat_message_stream(
+    chat_id: int, data: dict, request: Request, db: Session = Depends(get_db)
+):
+    """
+    Same pipeline as chat_message but emits the reply token by token.
+
+    Events: `token` ({"text"}) for every delta, `meta` once with
+    time_to_first_token_ms, then `done` with the persisted bot message and
+    timings after the exchange and token usage are saved, or `error`. A reply
+    cut off by a provider error ends with `error` and is not saved or billed.
+    Failures are logged as SupportTickets like chat_message does.
+    """
+    started_at = perf_counter()
+    user_id = None
+    user_msg = data.get("message")
+    bot_id = data.get("bot_id")
 
-        # Update token usage
-        consumed_token = SimpleNamespace(
-            request_token=request_tokens,
-            response_token=openai_response_tokens,
-            open_ai_request_token=openai_request_tokens,
-            open_ai_response_token=openai_response_tokens,
-            request_message=1,
-            response_message=1,
-        )
-        update_token_usage_on_consumption(
-            consumed_token=consumed_token,
-            consumed_token_type="direct_bot",
-            bot_id=bot_id,
-            db=db,
-        )
+    try:
+        token = request.cookies.get("access_token")
+        if token:
+            payload = decode_access_token(token)
+            user_id = int(payload.get("user_id"))
 
-        return bot_message
+        if not user_msg:
+            raise HTTPException(status_code=400, detail="Message required")
 
+        chatbot, chat = await asyncio.to_thread(
+            _verify_chat_request, db, bot_id, chat_id, user_id
+        )
+    except HTTPException as e:
+        _log_failed_chat_message(db, user_id, chat_id, bot_id, user_msg, str(e.detail))
+        raise
     except Exception as e:
-        error_detail = str(e)
-        # Log failed user message as SupportTicket
-        if user_msg and bot_id:
-            try:
-                ticket = SupportTicket(
-                    user_id=user_id,
-                    subject=f"ChatBot Exception (chat_id={chat_id}, bot_id={bot_id})",
-                    message=f"User Message: {user_msg}\n  Error Message: {error_detail}",
-                    status=Status.issue_bug,
-                    # error=f"User Message: {user_msg}\nError Message: {error_detail}"
-                )
-                db.add(ticket)
-                db.commit()
-            except Exception as db_exc:
-                print("Failed to log SupportTicket:", db_exc)
-
-        # Raise HTTP error
+        _log_failed_chat_message(db, user_id, chat_id, bot_id, user_msg, str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
-
+    async def event_stream():
+        # The request scoped session is closed once the response starts
+        # streaming, so generation and persistence use their own session.
+        stream_db = SessionLocal()
+        first_token_ms = None
+        try:
+            async for event, payload in stream_chatbot_reply(
+                db=stream_db, chatbot=chatbot, chat_id=chat_id, user_msg=user_msg
+            ):
+                if event == "token":
+                    if first_token_ms is None:
+                        first_token_ms = round((perf_counter() - started_at) * 1000)
+                        print(f"Time to first token: {first_token_ms} ms")
+                        yield _sse("meta", {"time_to_first_token_ms": first_token_ms})
+                    yield _sse("token", {"text": payload})
+                    continue
+
+                bot_message = await asyncio.to_thread(
+                    _save_chat_exchange,
+                    stream_db,
+                    user_id,
+                    bot_id,
+                    chat_id,
+                    user_msg,
+                    payload,
+                )
+                yield _sse(
+                    "done",
+                    {
+                        "message": jsonable_encoder(
+                            ChatMessageRead.model_validate(
+                                bot_message, from_attributes=True
+                            )
+                        ),
+                        "time_to_first_token_ms": first_token_ms,
+                        "total_ms": round((perf_counter() - started_at) * 1000),
+                    },
+                )
+        except Exception as e:
+            print(f"Error streaming chat message: {e}")
+            await asyncio.to_thread(
+                _log_failed_chat_message, stream_db, user_id, chat_id, bot_id, user_msg, str(e)
+            )
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 async def check_available_char_limit(
@@ -588,25 +661,8 @@ async def check_available_char_limit(
     if not current_plan or current_plan.expiry_date < datetime.utcnow():
         raise HTTPException(status_code=400, detail="No active user plan found")
 
-    # Sum of all used characters (from all chatbots)
-    total_chars_used = (
-        db.query(func.sum(ChatBotsDocLinks.chars))
-        .filter(ChatBotsDocLinks.user_id == user_id)
-        .scalar()
-        or 0
-    )
-
-    # Add chatbot `text_content` and FAQs characters to the total
-    chatbots = db.query(ChatBots).filter(ChatBots.user_id == user_id).all()
-    for chatbot in chatbots:
-        if chatbot.text_content:
-            total_chars_used += len(chatbot.text_content.strip())
-
-        faqs = db.query(ChatBotsFaqs).filter(ChatBotsFaqs.bot_id == chatbot.id).all()
-        for faq in faqs:
-            question = faq.question.strip() if faq.question else ""
-            answer = faq.answer.strip() if faq.answer else ""
-            total_chars_used += len(question) + len(answer)
+    # Trained chunks, chatbot `text_content` and FAQs, from the per-user ledger
+    total_chars_used = get_char_usage(db, user_id).total_chars
 
     # Add the characters the user is trying to save now
     total_with_new = total_chars_used + new_chars
@@ -641,6 +697,7 @@ async def delete_token_chat(token: str, db: Session = Depends(get_db)):
         db.query(ChatMessage).filter(ChatMessage.chat_id == chat_session.id).delete()
 
         db.commit()
+        drop_chat_history(chat_session.id)
         return {"message": "Chat deleted successfully"}
     except HTTPException as http_exc:
         raise http_exc
@@ -655,6 +712,7 @@ async def delete_user_chats(chat_id: int, db: Session = Depends(get_db)):
         # Delete all messages related to this chat
         db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id).delete()
         db.commit()
+        drop_chat_history(chat_id)
         return {"message": "Chat deleted successfully"}
     except HTTPException as http_exc:
         raise http_exc
@@ -766,14 +824,13 @@ async def chat_message_tokens_summary(
         # First day of current month
         start_of_month = datetime(today.year, today.month, 1)
 
-        # Initialize encoder
-        encoder = tiktoken.encoding_for_model("gpt-3.5-turbo")
-
         # Helper function to process messages and calculate tokens
         def process_messages(messages):
             user_messages = []
             bot_messages = []
             user_ids = set()
+            cached_responses = 0
+            llm_tokens_saved = 0
 
             for message in messages:
                 if message.sender == "user":
@@ -781,13 +838,16 @@ async def chat_message_tokens_summary(
                     user_ids.add(message.user_id)
                 elif message.sender == "bot":
                     bot_messages.append(message.message)
+                    if message.from_cache:
+                        cached_responses += 1
+                        llm_tokens_saved += message.tokens_saved or 0
 
             # Calculate tokens and messages
             request_tokens = 0
             request_messages = 0
             if user_messages:
                 combined_user_text = " ".join(user_messages)
-                request_tokens = len(encoder.encode(combined_user_text))
+                request_tokens = count_tokens(combined_user_text)
                 request_messages = len(user_messages)
 
             response_tokens = 0
@@ -806,7 +866,7 @@ async def chat_message_tokens_summary(
                     cleaned_response = cleaned_response.strip()
 
                 cleaned_response = re.sub(r"\s+", " ", cleaned_response).strip()
-                response_tokens = len(encoder.encode(cleaned_response))
+                response_tokens = count_tokens(cleaned_response)
                 response_messages = len(bot_messages)
 
             return {
@@ -815,6 +875,13 @@ async def chat_message_tokens_summary(
                 "users": len(user_ids),
                 "request_messages": request_messages,
                 "response_messages": response_messages,
+                "cached_responses": cached_responses,
+                "cache_hit_rate": (
+                    round(cached_responses / response_messages, 4)
+                    if response_messages
+                    else 0.0
+                ),
+                "llm_tokens_saved": llm_tokens_saved,
             }
 
         # Get today's messages
@@ -853,6 +920,9 @@ async def chat_message_tokens_summary(
                 "users": 0,
                 "request_messages": 0,
                 "response_messages": 0,
+                "cached_responses": 0,
+                "cache_hit_rate": 0.0,
+                "llm_tokens_saved": 0,
             }
         )
 
@@ -865,6 +935,9 @@ async def chat_message_tokens_summary(
                 "users": 0,
                 "request_messages": 0,
                 "response_messages": 0,
+                "cached_responses": 0,
+                "cache_hit_rate": 0.0,
+                "llm_tokens_saved": 0,
             }
         )
         print(json.dumps(today_data))
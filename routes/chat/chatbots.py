@@ -17,6 +17,9 @@ from routes.chat.pinecone import delete_documents_from_pinecone
 from routes.chat.tuning import seed_instruction_prompts_template
 from routes.subscriptions.token_usage import generate_token_usage
 from schemas.chatSchema.chatSchema import  CreateBot
+from utils.bot_snapshot import bump_knowledge_version, invalidate_bot_snapshot
+from utils.chat_history import drop_chat_history
+from utils.char_ledger import adjust_char_usage, refresh_char_usage, text_content_chars
 from utils.utils import decode_access_token
 
 
@@ -104,6 +107,12 @@ async def update_chatbot(data: CreateBot, db: Session = Depends(get_db)):
                 db=db,
                 new_chars=len(data.text_content),
             )
+            adjust_char_usage(
+                db,
+                chatbot.user_id,
+                text_content_chars=text_content_chars(data.text_content)
+                - text_content_chars(chatbot.text_content),
+            )
             chatbot.text_content = data.text_content
 
         if data.creativity is not None:
@@ -134,6 +143,10 @@ async def update_chatbot(data: CreateBot, db: Session = Depends(get_db)):
         # Save all updates
         db.commit()
         db.refresh(chatbot)
+        if data.text_content is not None or data.creativity is not None:
+            bump_knowledge_version(db, chatbot.id)
+        else:
+            invalidate_bot_snapshot(chatbot.id)
 
         return chatbot
 
@@ -264,7 +277,10 @@ async def delete_chatbot(bot_id: int, request: Request, db: Session = Depends(ge
         db.query(ChatBots).filter(
             ChatBots.id == bot_id, ChatBots.user_id == user_id
         ).delete(synchronize_session=False)
+        refresh_char_usage(db, user_id)
         db.commit()
+        invalidate_bot_snapshot(bot_id)
+        drop_chat_history(*session_ids)
         return {"message": "Chatbot with all data deleted successfully"}
     except HTTPException as http_exc:
         raise http_exc
@@ -7,6 +7,8 @@ from decorators.product_status import check_product_status
 from models.chatModel.chatModel import  ChatBots,  ChatBotsFaqs
 from routes.chat.chat import check_available_char_limit
 from schemas.chatSchema.chatSchema import CreateBotFaqs, FaqResponse, UpdateBotFaqs
+from utils.bot_snapshot import bump_knowledge_version
+from utils.char_ledger import adjust_char_usage, bot_owner_id, faq_chars, refresh_char_usage
 from utils.utils import decode_access_token
 
 
@@ -45,6 +47,7 @@ async def create_chatbot_faqs(
 
         # If within limit, proceed to save
         for qa in data.questions:
+            adjust_char_usage(db, bot.user_id, faq_chars=faq_chars(qa.question, qa.answer))
             new_chatbot_faq = ChatBotsFaqs(
                 user_id=user_id,
                 bot_id=data.bot_id,
@@ -56,6 +59,7 @@ async def create_chatbot_faqs(
             db.refresh(new_chatbot_faq)
             created_faqs.append(new_chatbot_faq)
 
+        bump_knowledge_version(db, data.bot_id)
         return {"bot_id": data.bot_id, "questions": created_faqs}
 
     except HTTPException as http_exc:
@@ -74,6 +78,7 @@ async def update_chatbot_faqs(
         payload = decode_access_token(token)
         user_id = int(payload.get("user_id"))
         updated_faqs = []
+        owner_id = bot_owner_id(db, data.bot_id)
 
         for qa in data.questions:
             existing_faq = db.query(ChatBotsFaqs).filter(
@@ -83,12 +88,19 @@ async def update_chatbot_faqs(
             ).first()
             
             if existing_faq:
+                adjust_char_usage(
+                    db,
+                    owner_id,
+                    faq_chars=faq_chars(qa.question, qa.answer)
+                    - faq_chars(existing_faq.question, existing_faq.answer),
+                )
                 existing_faq.question = qa.question
                 existing_faq.answer = qa.answer
                 db.commit()
                 db.refresh(existing_faq)
                 updated_faqs.append(existing_faq)
 
+        bump_knowledge_version(db, data.bot_id)
         return {
             "bot_id": data.bot_id,
             "questions": [
@@ -153,8 +165,12 @@ async def delete_single_faq(
         if not faq:
             raise HTTPException(status_code=404, detail="FAQ not found")
 
+        adjust_char_usage(
+            db, bot_owner_id(db, bot_id), faq_chars=-faq_chars(faq.question, faq.answer)
+        )
         db.delete(faq)
         db.commit()
+        bump_knowledge_version(db, bot_id)
 
         return {"message": "FAQ deleted successfully."}
     except Exception as e:
@@ -174,7 +190,9 @@ async def delete_all_faqs(bot_id: int, request: Request, db: Session = Depends(g
         deleted = (
             db.query(ChatBotsFaqs).filter_by(bot_id=bot_id, user_id=user_id).delete()
         )
+        refresh_char_usage(db, bot_owner_id(db, bot_id))
         db.commit()
+        bump_knowledge_version(db, bot_id)
 
         return {"message": f"{deleted} FAQs deleted successfully."}
     except Exception as e:
@@ -13,6 +13,7 @@ from schemas.chatSchema.tuningSchema import (
     InstructionPromptFetch,
 )
 from models.chatModel.chatModel import ChatBots
+from utils.bot_snapshot import bump_knowledge_version
 from utils.utils import decode_access_token
 from decorators.product_status import check_product_status
 
@@ -66,6 +67,7 @@ async def create_or_update_prompts(
                 updated_prompts.append(new_prompt)
 
         db.commit()
+        bump_knowledge_version(db, data.bot_id)
 
         # Refresh all updated/created prompts
         for prompt in updated_prompts:
@@ -178,6 +180,7 @@ def seed_instruction_prompts_template(
         )
         db.add(prompt_entry)
         db.commit()
+        bump_knowledge_version(db, bot_id)
 
         return True, f"Added Instruction prompt for domain: {domain}"
 
@@ -1,7 +1,6 @@
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Tuple, Union,Optional
 from sqlalchemy.orm import Session
-from models.adminModel.adminModel import SubscriptionPlans
 from models.authModel.authModel import AuthUser
 from models.chatModel.chatModel import ChatBots, ChatMessage, ChatSession
 from models.subscriptions.token_usage import TokenUsage, TokenUsageHistory
@@ -10,6 +9,7 @@ from models.subscriptions.userCredits import UserCredits
 from datetime import datetime, timedelta
 from sqlalchemy import func, text
 from fastapi import HTTPException
+from utils.admin_settings import get_subscription_plan
 
 
 """When user purchased new susbscription"""
@@ -622,8 +622,8 @@ def update_token_usage_on_consumption(
         # check user plan here if plan is enterprise, then use entity base_rate_per_message from user table not message_per_unit from user credit
         
         user = db.query(AuthUser).filter(AuthUser.id == bot_token_usage.user_id).first()
-        user_plan = db.query(SubscriptionPlans).filter(SubscriptionPlans.id == user.plan).filter(SubscriptionPlans.is_enterprise == True).first()
-        if user_plan and user.base_rate_per_message:
+        user_plan = get_subscription_plan(db, user.plan)
+        if user_plan and user_plan.is_enterprise and user.base_rate_per_message:
             credits_consumed_messages = (total_message_consumption // user.base_rate_per_message) + (
             1 if total_message_consumption % credit.message_per_unit > 0 else 0
             )
@@ -64,6 +64,10 @@ class ChatMessageTokensToday(BaseModel):
     users: int
     request_messages: int
     response_messages: int
+    # Bot replies served from the semantic answer cache
+    cached_responses: int = 0
+    cache_hit_rate: float = 0.0
+    llm_tokens_saved: int = 0
 
 
 class ChatMessageTokensSummary(BaseModel):
@@ -0,0 +1,52 @@
+import argparse
+
+from utils.embeddings import PROJECTED_TOOLS
+from utils.projection_training import train_projection
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train versioned embedding projection models offline"
+    )
+    parser.add_argument(
+        "--tool",
+        choices=PROJECTED_TOOLS,
+        action="append",
+        help="Tool to train (repeatable); defaults to all projected tools",
+    )
+    parser.add_argument(
+        "--refresh-samples",
+        action="store_true",
+        help="Re-gather the sample corpus instead of using samples.json",
+    )
+    parser.add_argument(
+        "--refresh-embeddings",
+        action="store_true",
+        help="Re-embed the corpus instead of using the cached .npy vectors",
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--activate",
+        action="store_true",
+        default=None,
+        help="Point `current` at the new version (requires retraining bots)",
+    )
+    args = parser.parse_args()
+
+    for tool in args.tool or PROJECTED_TOOLS:
+        result = train_projection(
+            tool,
+            refresh_samples=args.refresh_samples,
+            refresh_embeddings=args.refresh_embeddings,
+            batch_size=args.batch_size,
+            activate=args.activate,
+        )
+        print(
+            f"✅ {tool} {result['version']}: "
+            f"{result['explained_variance']:.1%} variance, "
+            f"{result['sample_count']} samples, active={result['active']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,31 @@
 # 1. Custom DeepSeek Embeddings Class
+import asyncio
+import json
 import os
+import weakref
+import httpx
 import requests
-from typing import List, Union
+from typing import AsyncIterator, List, Optional, Union
 from langchain_core.embeddings import Embeddings
 from langchain_core.language_models.llms import BaseLLM
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+# Keep-alive pools shared by every DeepSeek client in the process
+_http_session = requests.Session()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Pooled httpx client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+        )
+        _async_clients[loop] = client
+    return client
 
 
 class DeepSeekEmbeddings(Embeddings):
@@ -37,7 +58,7 @@ class DeepSeekEmbeddings(Embeddings):
         }
         
         try:
-            response = requests.post(
+            response = _http_session.post(
                 f"{self.base_url}/embeddings",
                 headers=self.headers,
                 json=payload,
@@ -58,6 +79,21 @@ class DeepSeekEmbeddings(Embeddings):
         return "deepseek"
 
 
+def _usage_metadata(usage: Optional[dict]) -> dict:
+    """
+    The API's usage block as response_metadata["token_usage"], the shape
+    LangChain's OpenAI models use; includes DeepSeek's prompt_cache_hit_tokens.
+    """
+    return {"token_usage": usage} if usage else {}
+
+
+def _to_ai_message(data: dict) -> AIMessage:
+    return AIMessage(
+        content=data["choices"][0]["message"]["content"],
+        response_metadata=_usage_metadata(data.get("usage")),
+    )
+
+
 class DeepSeekLLM(BaseLLM):
     """DeepSeek language model implementation"""
     model_name: str = "deepseek-chat"
@@ -79,7 +115,7 @@ class DeepSeekLLM(BaseLLM):
             "Content-Type": "application/json"
         }
     
-    def _generate(self, messages: list, **kwargs) -> str:
+    def _generate(self, messages: list, **kwargs) -> AIMessage:
         """Generate response from DeepSeek API"""
         payload = {
             "model": self.model_name,
@@ -90,7 +126,7 @@ class DeepSeekLLM(BaseLLM):
         }
         
         try:
-            response = requests.post(
+            response = _http_session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
                 json=payload,
@@ -101,11 +137,11 @@ class DeepSeekLLM(BaseLLM):
             if response.status_code == 402:
                 error_msg = "Payment Required. Please check your DeepSeek API billing status."
                 print(error_msg)
-                return error_msg
+                return AIMessage(content=error_msg)
 
             response.raise_for_status()
             data = response.json()
-            return data["choices"][0]["message"]["content"]
+            return _to_ai_message(data)
         except requests.exceptions.RequestException as e:
             print(f"DeepSeek API error: {str(e)}")
             raise
@@ -113,10 +149,91 @@ class DeepSeekLLM(BaseLLM):
             print(f"Response parsing error: {str(e)}")
             raise
     
-    def invoke(self, input: Union[str, list], **kwargs) -> str:
-        """Handle both single messages and conversation history"""
+    async def _agenerate(self, messages: list, **kwargs) -> AIMessage:
+        """Async counterpart of _generate so chat requests don't block the event loop"""
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            **kwargs
+        }
+
+        try:
+            response = await _get_async_client().post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+            )
+
+            # Handle 402 Payment Required explicitly
+            if response.status_code == 402:
+                error_msg = "Payment Required. Please check your DeepSeek API billing status."
+                print(error_msg)
+                return AIMessage(content=error_msg)
+
+            response.raise_for_status()
+            data = response.json()
+            return _to_ai_message(data)
+        except httpx.HTTPError as e:
+            print(f"DeepSeek API error: {str(e)}")
+            raise
+        except (KeyError, IndexError) as e:
+            print(f"Response parsing error: {str(e)}")
+            raise
+
+    async def _astream(self, messages: list, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        """
+        Stream completion deltas from the DeepSeek SSE endpoint.
+
+        The final chunk carries no text but the request's usage (include_usage).
+        """
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            **kwargs
+        }
+
+        async with _get_async_client().stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json=payload,
+        ) as response:
+            if response.status_code == 402:
+                error_msg = "Payment Required. Please check your DeepSeek API billing status."
+                print(error_msg)
+                yield AIMessageChunk(content=error_msg)
+                return
+
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError as e:
+                    print(f"Response parsing error: {str(e)}")
+                    continue
+                if event.get("usage"):
+                    yield AIMessageChunk(
+                        content="", response_metadata=_usage_metadata(event["usage"])
+                    )
+                choices = event.get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    yield AIMessageChunk(content=content)
+
+    def _to_messages(self, input: Union[str, list]) -> list:
         if isinstance(input, str):
-            messages = [{"role": "user", "content": input}]
+            return [{"role": "user", "content": input}]
         elif isinstance(input, list):
             messages = []
             for msg in input:
@@ -124,10 +241,21 @@ class DeepSeekLLM(BaseLLM):
                     messages.append({"role": "user", "content": msg.content})
                 elif isinstance(msg, AIMessage):
                     messages.append({"role": "assistant", "content": msg.content})
-        else:
-            raise TypeError("Input must be str or list of messages")
-            
-        return self._generate(messages, **kwargs)
+            return messages
+        raise TypeError("Input must be str or list of messages")
+
+    def invoke(self, input: Union[str, list], **kwargs) -> AIMessage:
+        """Handle both single messages and conversation history"""
+        return self._generate(self._to_messages(input), **kwargs)
+
+    async def ainvoke(self, input: Union[str, list], **kwargs) -> AIMessage:
+        """Async variant of invoke"""
+        return await self._agenerate(self._to_messages(input), **kwargs)
+
+    async def astream(self, input: Union[str, list], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        """Yield the reply incrementally as DeepSeek generates it, then its usage"""
+        async for chunk in self._astream(self._to_messages(input), **kwargs):
+            yield chunk
     
     @property
     def _llm_type(self) -> str:
@@ -0,0 +1,104 @@
+import json
+from types import SimpleNamespace
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.adminModel.adminModel import PaymentGateway, SubscriptionPlans
+from models.adminModel.productModel import Product
+from models.adminModel.toolsModal import ToolsUsed
+from utils.cache import TieredCache
+
+ACTIVE_TOOL = "active_tool"
+PRODUCTS = "products"
+SUBSCRIPTION_PLANS = "subscription_plans"
+PAYMENT_GATEWAYS = "payment_gateways"
+# Never cached (the cache may be Redis); read from the DB where a payment needs them
+PAYMENT_GATEWAY_SECRETS = {"api_key"}
+
+admin_settings_cache = TieredCache(
+    namespace="admin_settings",
+    maxsize=16,
+    ttl=settings.ADMIN_SETTINGS_TTL,
+    dumps=lambda value: json.dumps(value, default=str),
+)
+
+
+def _row_to_dict(row, exclude=()) -> dict:
+    return {
+        column.name: getattr(row, column.name)
+        for column in row.__table__.columns
+        if column.name not in exclude
+    }
+
+
+def _load_active_tool(db: Session):
+    tool = db.query(ToolsUsed).filter_by(status=True).first()
+    # Cache "no active tool" as an empty dict so it is not re-queried every call
+    return _row_to_dict(tool) if tool else {}
+
+
+def _load_products(db: Session):
+    return {
+        product.name.lower(): _row_to_dict(product)
+        for product in db.query(Product).all()
+        if product.name
+    }
+
+
+def _load_subscription_plans(db: Session):
+    return [
+        _row_to_dict(plan)
+        for plan in db.query(SubscriptionPlans).order_by(SubscriptionPlans.id).all()
+    ]
+
+
+def _load_payment_gateways(db: Session):
+    return [
+        _row_to_dict(gateway, exclude=PAYMENT_GATEWAY_SECRETS)
+        for gateway in db.query(PaymentGateway).order_by(PaymentGateway.id).all()
+    ]
+
+
+def get_active_tool(db: Session) -> Optional[SimpleNamespace]:
+    """Currently enabled ToolsUsed entry (tool, model) or None"""
+    tool = admin_settings_cache.get_or_load(ACTIVE_TOOL, lambda: _load_active_tool(db))
+    return SimpleNamespace(**tool) if tool else None
+
+
+def get_product_status(db: Session, name: str) -> Optional[str]:
+    """Status string of a product ("active" / "deactive"), None if unknown"""
+    products = admin_settings_cache.get_or_load(PRODUCTS, lambda: _load_products(db))
+    product = products.get(name.lower())
+    return product["status"] if product else None
+
+
+def get_subscription_plans(db: Session) -> List[SimpleNamespace]:
+    plans = admin_settings_cache.get_or_load(
+        SUBSCRIPTION_PLANS, lambda: _load_subscription_plans(db)
+    )
+    return [SimpleNamespace(**plan) for plan in plans]
+
+
+def get_subscription_plan(db: Session, plan_id: int) -> Optional[SimpleNamespace]:
+    if plan_id is None:
+        return None
+    for plan in get_subscription_plans(db):
+        if plan.id == int(plan_id):
+            return plan
+    return None
+
+
+def get_payment_gateways(db: Session) -> List[SimpleNamespace]:
+    """Payment gateways without their credentials"""
+    gateways = admin_settings_cache.get_or_load(
+        PAYMENT_GATEWAYS, lambda: _load_payment_gateways(db)
+    )
+    return [SimpleNamespace(**gateway) for gateway in gateways]
+
+
+def invalidate_admin_settings(*sections: str):
+    """Drop the given sections (ACTIVE_TOOL, PRODUCTS, ...), or all of them when none are given"""
+    for section in sections or (ACTIVE_TOOL, PRODUCTS, SUBSCRIPTION_PLANS, PAYMENT_GATEWAYS):
+        admin_settings_cache.delete(section)
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+from config import settings
+from utils.bot_snapshot import get_knowledge_version
+from utils.embeddings import aembed_query_cached
+from utils.metrics import Counters
+from utils.tokenCounter import count_tokens
+
+answer_cache_counters = Counters("answer_cache")
+
+
+class BotAnswers:
+    """Cached answers of one bot and knowledge version, searched by query embedding"""
+
+    def __init__(self):
+        self.vectors = None
+        self.answers = []
+        self.lock = threading.Lock()
+
+    def best(self, vector: np.ndarray):
+        with self.lock:
+            if self.vectors is None or not len(self.answers):
+                return 0.0, None
+            scores = self.vectors @ vector
+            best = int(np.argmax(scores))
+            return float(scores[best]), self.answers[best]
+
+    def add(self, vector: np.ndarray, answer: SimpleNamespace):
+        with self.lock:
+            if self.vectors is None or self.vectors.shape[1] != len(vector):
+                self.vectors = np.zeros((0, len(vector)), dtype=np.float32)
+                self.answers = []
+            # Oldest answers make room once the bot reaches its entry budget
+            keep = settings.ANSWER_CACHE_MAX_ENTRIES - 1
+            self.vectors = np.vstack([self.vectors[len(self.vectors) - keep :], vector[None, :]])
+            self.answers = self.answers[len(self.answers) - keep :] + [answer]
+
+
+_bots = TTLCache(maxsize=settings.ANSWER_CACHE_MAX_BOTS, ttl=settings.ANSWER_CACHE_TTL)
+_bots_lock = threading.Lock()
+
+
+def _bot_answers(key: tuple, create: bool) -> Optional[BotAnswers]:
+    with _bots_lock:
+        answers = _bots.get(key)
+        if answers is None and create:
+            answers = _bots[key] = BotAnswers()
+        return answers
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+async def find_cached_answer(
+    db, chatbot, active_tool, query: str, message_history
+) -> SimpleNamespace:
+    """
+    Look up an answer the bot already gave to a near-identical query.
+
+    Returns a lookup whose `answer` (response_content, openai_request_tokens,
+    openai_response_tokens) is set on a hit; pass it to cache_answer after
+    generating on a miss. Follow-up messages are never cached since their
+    answer depends on the conversation so far.
+    """
+    lookup = SimpleNamespace(key=None, vector=None, answer=None)
+    if settings.ANSWER_CACHE_MAX_ENTRIES <= 0 or message_history or not active_tool:
+        return lookup
+
+    knowledge_version = await asyncio.to_thread(get_knowledge_version, db, chatbot.id)
+    lookup.key = (chatbot.id, knowledge_version, active_tool.tool, active_tool.model)
+    lookup.vector = _unit(await aembed_query_cached(active_tool.tool, query))
+    answers = _bot_answers(lookup.key, create=False)
+    score, answer = answers.best(lookup.vector) if answers else (0.0, None)
+
+    if answer is not None and score >= settings.ANSWER_CACHE_THRESHOLD:
+        lookup.answer = answer
+        tokens_saved = answer.openai_request_tokens + answer.openai_response_tokens
+        answer_cache_counters.add(lookups=1, hits=1, tokens_saved=tokens_saved)
+        print(f"[DEBUG] Answer cache hit for bot {chatbot.id} (cosine {score:.3f})")
+    else:
+        answer_cache_counters.add(lookups=1)
+    return lookup
+
+
+def cache_answer(lookup: SimpleNamespace, reply):
+    """Remember a freshly generated reply for the lookup that missed"""
+    if lookup.key is None or lookup.answer is not None:
+        return
+    _bot_answers(lookup.key, create=True).add(
+        lookup.vector,
+        SimpleNamespace(
+            response_content=reply.response_content,
+            openai_request_tokens=reply.openai_request_tokens,
+            openai_response_tokens=reply.openai_response_tokens,
+        ),
+    )
+
+
+def apply_cached_answer(reply, lookup: SimpleNamespace, query: str):
+    """Fill a reply from a cache hit; no LLM tokens are spent on it"""
+    answer = lookup.answer
+    reply.response_content = answer.response_content
+    reply.request_tokens = count_tokens(query)
+    reply.from_cache = True
+    reply.tokens_saved = answer.openai_request_tokens + answer.openai_response_tokens
+    return reply
@@ -0,0 +1,146 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.chatModel.chatModel import ChatBots, ChatBotsFaqs
+from models.chatModel.tuning import DBInstructionPrompt
+from utils.cache import TieredCache
+
+
+@dataclass(frozen=True)
+class BotSnapshot:
+    """
+    Read-only copy of the bot configuration the chat hot path needs.
+
+    Attribute names mirror ChatBots so the snapshot can be passed wherever a
+    chatbot row was used (e.g. check_rate_limit). Message counters change on
+    every message and are read live from TokenUsage instead.
+    """
+
+    id: int
+    user_id: Optional[int]
+    chatbot_name: str
+    public: bool
+    text_content: Optional[str]
+    creativity: Optional[int]
+    token: Optional[str]
+    domains: Optional[str]
+    allow_domains: bool
+    rate_limit_enabled: bool
+    limit_to: Optional[int]
+    every_minutes: Optional[int]
+    instruction_prompts: Tuple[Tuple[str, str], ...]
+    faqs: Tuple[Tuple[Optional[str], Optional[str]], ...]
+
+    @property
+    def dict_instruction_prompts(self) -> list:
+        return [{prompt_type: prompt} for prompt_type, prompt in self.instruction_prompts]
+
+    def faq_answer(self, user_msg: str) -> Optional[str]:
+        """In-memory equivalent of get_response_from_faqs"""
+        cleaned_msg = user_msg.lower().strip().replace("?", "")
+        for question, answer in self.faqs:
+            if question and cleaned_msg in question.lower():
+                return answer
+        return None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BotSnapshot":
+        # Entries cached by an older release may carry fields since removed
+        data = {name: data[name] for name in cls.__dataclass_fields__ if name in data}
+        for field in ("instruction_prompts", "faqs"):
+            data[field] = tuple(tuple(item) for item in data[field])
+        return cls(**data)
+
+
+def build_bot_snapshot(db: Session, bot_id: int) -> Optional[BotSnapshot]:
+    chatbot = db.query(ChatBots).filter(ChatBots.id == bot_id).first()
+    if not chatbot:
+        return None
+
+    instruction_prompts = (
+        db.query(DBInstructionPrompt).filter(DBInstructionPrompt.bot_id == bot_id).all()
+    )
+    faqs = (
+        db.query(ChatBotsFaqs)
+        .filter(ChatBotsFaqs.bot_id == bot_id)
+        .order_by(ChatBotsFaqs.id)
+        .all()
+    )
+
+    return BotSnapshot(
+        id=chatbot.id,
+        user_id=chatbot.user_id,
+        chatbot_name=chatbot.chatbot_name,
+        public=bool(chatbot.public),
+        text_content=chatbot.text_content,
+        creativity=chatbot.creativity,
+        token=chatbot.token,
+        domains=chatbot.domains,
+        allow_domains=bool(chatbot.allow_domains),
+        rate_limit_enabled=bool(chatbot.rate_limit_enabled),
+        limit_to=chatbot.limit_to,
+        every_minutes=chatbot.every_minutes,
+        instruction_prompts=tuple((p.type, p.prompt) for p in instruction_prompts),
+        faqs=tuple((faq.question, faq.answer) for faq in faqs),
+    )
+
+
+bot_snapshot_cache = TieredCache(
+    namespace="bot_snapshot",
+    maxsize=4096,
+    ttl=settings.BOT_SNAPSHOT_TTL,
+    dumps=lambda snapshot: json.dumps(snapshot.to_dict(), default=str),
+    loads=lambda raw: BotSnapshot.from_dict(json.loads(raw)),
+)
+
+
+def get_bot_snapshot(db: Session, bot_id: int) -> Optional[BotSnapshot]:
+    """Cached BotSnapshot; zero queries on a hit"""
+    if bot_id is None:
+        return None
+    return bot_snapshot_cache.get_or_load(
+        int(bot_id), lambda: build_bot_snapshot(db, int(bot_id))
+    )
+
+
+def invalidate_bot_snapshot(*bot_ids):
+    """Drop cached snapshots after a write to a bot's config, prompts or FAQs"""
+    for bot_id in bot_ids:
+        if bot_id is not None:
+            bot_snapshot_cache.delete(int(bot_id))
+
+
+def get_knowledge_version(db: Session, bot_id: int) -> int:
+    """
+    The bot's current knowledge version, read from the DB on every call.
+
+    It is not part of the cached snapshot: training bumps it in the Celery
+    worker, and without Redis no other process would see that bump before
+    its snapshot expired.
+    """
+    version = db.query(ChatBots.knowledge_version).filter(ChatBots.id == bot_id).scalar()
+    return version or 0
+
+
+def bump_knowledge_version(db: Session, *bot_ids):
+    """
+    Commit a new knowledge version after training, FAQ, tuning or text_content
+    changes, so answers cached for the old version are not served again.
+    """
+    bot_ids = [int(bot_id) for bot_id in bot_ids if bot_id is not None]
+    if bot_ids:
+        db.query(ChatBots).filter(ChatBots.id.in_(bot_ids)).update(
+            {ChatBots.knowledge_version: func.coalesce(ChatBots.knowledge_version, 0) + 1},
+            synchronize_session=False,
+        )
+        db.commit()
+    invalidate_bot_snapshot(*bot_ids)
+
@@ -0,0 +1,240 @@
+import json
+import threading
+from typing import Any, Callable, Optional
+
+from cachetools import TTLCache
+
+from config import settings
+
+_MISSING = object()
+
+_redis_client = None
+_redis_resolved = False
+_redis_lock = threading.Lock()
+
+_caches = []
+
+
+def get_redis():
+    """Shared Redis client, or None when REDIS_URL is unset or unreachable"""
+    global _redis_client, _redis_resolved
+    if _redis_resolved:
+        return _redis_client
+
+    with _redis_lock:
+        if not _redis_resolved:
+            if settings.REDIS_URL:
+                try:
+                    import redis
+
+                    client = redis.Redis.from_url(
+                        settings.REDIS_URL,
+                        socket_timeout=0.5,
+                        socket_connect_timeout=0.5,
+                    )
+                    client.ping()
+                    _redis_client = client
+                except Exception as e:
+                    print(f"[WARN] Redis unavailable, using in-process cache only: {e}")
+            _redis_resolved = True
+    return _redis_client
+
+
+class TieredCache:
+    """
+    Process-local TTL cache with an optional Redis tier.
+
+    Without Redis every worker keeps its own copy for `ttl` seconds. With
+    REDIS_URL set, Redis holds the shared copy and the local tier only keeps
+    entries for `local_ttl` seconds, so a delete() issued by one worker is
+    seen by the others within that window.
+
+    With `getsizeof`, `maxsize` bounds the summed size of the local entries
+    (e.g. bytes) instead of their count.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 1024,
+        ttl: int = 300,
+        local_ttl: int = 5,
+        dumps: Callable[[Any], Any] = json.dumps,
+        loads: Callable[[Any], Any] = json.loads,
+        getsizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        shared = bool(settings.REDIS_URL)
+        self._local = TTLCache(
+            maxsize=maxsize,
+            ttl=min(ttl, local_ttl) if shared else ttl,
+            getsizeof=getsizeof,
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def _redis_key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._local.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                raw = redis_client.get(self._redis_key(key))
+            except Exception as e:
+                print(f"[WARN] Redis get failed for {self._redis_key(key)}: {e}")
+                raw = None
+            if raw is not None:
+                value = self.loads(raw)
+                with self._lock:
+                    self._set_local(key, value)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def _set_local(self, key, value):
+        try:
+            self._local[key] = value
+        except ValueError:
+            # Larger than the whole local tier; keep it in Redis only
+            pass
+
+    def set(self, key, value):
+        with self._lock:
+            self._set_local(key, value)
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.setex(self._redis_key(key), self.ttl, self.dumps(value))
+            except Exception as e:
+                print(f"[WARN] Redis set failed for {self._redis_key(key)}: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.delete(self._redis_key(key))
+            except Exception as e:
+                print(f"[WARN] Redis delete failed for {self._redis_key(key)}: {e}")
+
+    def get_many(self, keys) -> dict:
+        """Found entries for `keys`, checking the local tier first and Redis in one MGET"""
+        keys = list(keys)
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                value = self._local.get(key, _MISSING)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+
+        redis_client = get_redis()
+        if missing and redis_client is not None:
+            try:
+                raws = redis_client.mget([self._redis_key(key) for key in missing])
+            except Exception as e:
+                print(f"[WARN] Redis mget failed for {self.namespace}: {e}")
+                raws = [None] * len(missing)
+            with self._lock:
+                for key, raw in zip(missing, raws):
+                    if raw is not None:
+                        value = self.loads(raw)
+                        self._set_local(key, value)
+                        found[key] = value
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._set_local(key, value)
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for key, value in items.items():
+                    pipe.setex(self._redis_key(key), self.ttl, self.dumps(value))
+                pipe.execute()
+            except Exception as e:
+                print(f"[WARN] Redis set_many failed for {self.namespace}: {e}")
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                print(f"[WARN] Redis delete_many failed for {self.namespace}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                for redis_key in redis_client.scan_iter(f"{self.namespace}:*"):
+                    redis_client.delete(redis_key)
+            except Exception as e:
+                print(f"[WARN] Redis clear failed for {self.namespace}: {e}")
+
+    def get_or_load(self, key, loader: Callable[[], Optional[Any]]):
+        """Return the cached value, calling loader() on a miss. None results are not cached."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._local),
+                "currsize": self._local.currsize,
+                "maxsize": self._local.maxsize,
+            }
+
+
+def cache_stats() -> list:
+    """Hit/miss counters of every TieredCache in this process"""
+    return [cache.stats() for cache in _caches]
@@ -0,0 +1,122 @@
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.chatModel.chatModel import ChatBots, ChatBotsDocChunks, ChatBotsFaqs
+from models.subscriptions.userCredits import UserCharUsage
+
+CHUNK_CHARS = "chunk_chars"
+TEXT_CONTENT_CHARS = "text_content_chars"
+FAQ_CHARS = "faq_chars"
+
+
+def text_content_chars(text_content) -> int:
+    return len(text_content.strip()) if text_content else 0
+
+
+def faq_chars(question, answer) -> int:
+    return len(question.strip() if question else "") + len(answer.strip() if answer else "")
+
+
+def _compute_usage(db: Session, user_id: int) -> dict:
+    """Usage from the raw tables; only run to seed or resync a ledger row"""
+    chunk = (
+        db.query(
+            func.coalesce(
+                func.sum(
+                    func.coalesce(
+                        ChatBotsDocChunks.char_count,
+                        func.char_length(ChatBotsDocChunks.content),
+                    )
+                ),
+                0,
+            )
+        )
+        .filter(ChatBotsDocChunks.user_id == user_id)
+        .scalar()
+    )
+    text_content = (
+        db.query(func.coalesce(func.sum(func.char_length(func.trim(ChatBots.text_content))), 0))
+        .filter(ChatBots.user_id == user_id)
+        .scalar()
+    )
+    faq = (
+        db.query(
+            func.coalesce(
+                func.sum(
+                    func.coalesce(func.char_length(func.trim(ChatBotsFaqs.question)), 0)
+                    + func.coalesce(func.char_length(func.trim(ChatBotsFaqs.answer)), 0)
+                ),
+                0,
+            )
+        )
+        .join(ChatBots, ChatBots.id == ChatBotsFaqs.bot_id)
+        .filter(ChatBots.user_id == user_id)
+        .scalar()
+    )
+    return {
+        CHUNK_CHARS: int(chunk),
+        TEXT_CONTENT_CHARS: int(text_content),
+        FAQ_CHARS: int(faq),
+    }
+
+
+def get_char_usage(db: Session, user_id: int) -> UserCharUsage:
+    """The user's ledger row, seeded from the raw tables the first time"""
+    usage = db.get(UserCharUsage, user_id)
+    if usage is not None:
+        return usage
+
+    try:
+        with db.begin_nested():
+            usage = UserCharUsage(user_id=user_id, **_compute_usage(db, user_id))
+            db.add(usage)
+    except IntegrityError:
+        # Seeded concurrently by another request
+        usage = db.get(UserCharUsage, user_id)
+    return usage
+
+
+def adjust_char_usage(db: Session, user_id: int, **deltas: int):
+    """
+    Add deltas (chunk_chars=..., faq_chars=..., text_content_chars=...) to the
+    user's ledger inside the caller's transaction.
+
+    Call it before the matching insert/update/delete is flushed, so a ledger
+    seeded by this call doesn't count the change twice.
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not user_id or not deltas:
+        return
+    get_char_usage(db, user_id)
+    db.execute(
+        update(UserCharUsage)
+        .where(UserCharUsage.user_id == user_id)
+        .values(
+            {
+                column: getattr(UserCharUsage, column) + delta
+                for column, delta in deltas.items()
+            }
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def refresh_char_usage(db: Session, user_id: int):
+    """Resync the ledger after bulk deletes (whole bots, all FAQs of a bot)"""
+    if not user_id:
+        return
+    usage = get_char_usage(db, user_id)
+    for column, value in _compute_usage(db, user_id).items():
+        setattr(usage, column, value)
+
+
+def drop_char_usage(db: Session, user_id: int):
+    db.query(UserCharUsage).filter(UserCharUsage.user_id == user_id).delete(
+        synchronize_session=False
+    )
+
+
+def bot_owner_id(db: Session, bot_id: int):
+    """FAQ and text_content characters count against the bot owner's plan"""
+    return db.query(ChatBots.user_id).filter(ChatBots.id == bot_id).scalar()
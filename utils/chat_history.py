@@ -0,0 +1,48 @@
+from typing import Callable, List
+
+from config import settings
+from utils.cache import TieredCache, get_redis
+
+# 3 user + 3 bot messages
+HISTORY_SIZE = 6
+
+# Newest-first recent messages per chat session. The local tier is kept for
+# one second when Redis is shared, so an append made by another worker is
+# picked up by the next message in the conversation. Without Redis each worker
+# would keep its own, possibly stale, copy, so the buffer is bypassed and the
+# (chat_id, created_at) indexed query is used instead.
+chat_history_cache = TieredCache(
+    namespace="chat_history",
+    maxsize=settings.CHAT_HISTORY_CACHE_SIZE,
+    ttl=settings.CHAT_HISTORY_TTL,
+    local_ttl=1,
+)
+
+
+def history_entry(sender: str, message: str, created_at) -> dict:
+    return {"sender": sender, "message": message, "time": created_at.isoformat()}
+
+
+def get_chat_history(chat_id, load: Callable[[], List[dict]]) -> List[dict]:
+    """Recent messages of the chat, calling load() (the DB query) only for a cold session"""
+    if get_redis() is None:
+        return load()
+    return chat_history_cache.get_or_load(int(chat_id), load)
+
+
+def append_chat_history(chat_id, entries: List[dict]):
+    """
+    Push newly saved messages (newest first) onto a warm session's buffer.
+
+    Cold sessions are left alone: their next read loads from the DB, which
+    already has these messages.
+    """
+    if get_redis() is None:
+        return
+    history = chat_history_cache.get(int(chat_id))
+    if history is not None:
+        chat_history_cache.set(int(chat_id), (list(entries) + history)[:HISTORY_SIZE])
+
+
+def drop_chat_history(*chat_ids):
+    chat_history_cache.delete_many(int(chat_id) for chat_id in chat_ids if chat_id is not None)
@@ -0,0 +1,27 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+_clients: Dict[Hashable, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key: Hashable, factory: Callable[[], Any]):
+    """
+    Return the long-lived client registered under `key`, building it once.
+
+    LLM and embedding clients keep their HTTP connection pools (and TLS
+    sessions) for as long as the instance lives, so they are shared across
+    requests instead of being rebuilt per call.
+    """
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            print(f"[DEBUG] Creating client {key}")
+            client = factory()
+            _clients[key] = client
+    return client
+
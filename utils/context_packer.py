@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+from typing import List, Optional
+
+from config import settings
+from utils.metrics import Counters
+from utils.model_limits import get_model_limits
+from utils.tokenCounter import TokenCounter
+
+packer_counters = Counters("context_packer")
+
+CONTEXT = "context"
+HISTORY = "history"
+
+
+def prompt_budget(model_name: str) -> int:
+    """Input tokens allowed per prompt: the configured budget, capped by the model window"""
+    limits = get_model_limits(model_name)
+    window = limits.context_window - min(limits.max_output_tokens, settings.PROMPT_OUTPUT_RESERVE)
+    return min(settings.PROMPT_TOKEN_BUDGET, window)
+
+
+def _pack_order() -> List[str]:
+    order = [name.strip() for name in settings.PROMPT_PACK_ORDER.split(",") if name.strip()]
+    order = [name for name in order if name in (CONTEXT, HISTORY)]
+    return order + [name for name in (CONTEXT, HISTORY) if name not in order]
+
+
+def pack_instructions(
+    counter: TokenCounter,
+    system_tokens: int,
+    text_content: Optional[str],
+    instruction_prompts: list,
+) -> SimpleNamespace:
+    """
+    Choose the bot's instructions for the cacheable prompt prefix.
+
+    text_content must always be followed, so it goes first and is truncated
+    to PROMPT_INSTRUCTIONS_SHARE of the budget rather than dropped. Instruction
+    prompts follow in order while they still fit. The choice depends only on
+    the bot and the model, never on the request, so the prefix stays
+    identical across requests.
+    """
+    remaining = int(prompt_budget(counter.model_name) * settings.PROMPT_INSTRUCTIONS_SHARE)
+    remaining -= system_tokens
+    dropped_tokens = dropped_pieces = 0
+
+    if text_content:
+        tokens = counter.count(text_content)
+        if tokens > remaining:
+            text_content = counter.truncate(text_content, remaining)
+            kept_tokens = counter.count(text_content)
+            dropped_tokens += tokens - kept_tokens
+            print(
+                f"[WARN] text_content truncated from {tokens} to {kept_tokens} tokens "
+                f"to fit the prompt budget of {counter.model_name}"
+            )
+            tokens = kept_tokens
+        remaining -= tokens
+
+    instructions = []
+    for piece in instruction_prompts or []:
+        tokens = counter.count(str(piece))
+        if tokens <= remaining:
+            instructions.append(piece)
+            remaining -= tokens
+        else:
+            dropped_tokens += tokens
+            dropped_pieces += 1
+
+    return SimpleNamespace(
+        text_content=text_content,
+        instruction_prompts=instructions,
+        dropped_tokens=dropped_tokens,
+        dropped_pieces=dropped_pieces,
+    )
+
+
+def pack_context(
+    counter: TokenCounter,
+    prefix,
+    fixed_tokens: int,
+    context: List[str],
+    message_history: list,
+) -> SimpleNamespace:
+    """
+    Fit the per-request prompt inputs into what the bot prefix leaves of the budget.
+
+    Pieces keep their relevance order within each section: ranked chunks and
+    newest history first. Sections are interleaved by rank (the best piece of
+    each before any second piece) in PROMPT_PACK_ORDER, and pieces that no
+    longer fit are dropped. `prefix` is the packed bot prefix (its `tokens`
+    include the system rules); `fixed_tokens` is what the question takes.
+    """
+    sections = {
+        CONTEXT: list(context or []),
+        HISTORY: list(message_history or []),
+    }
+    budget = prompt_budget(counter.model_name)
+    remaining = budget - prefix.tokens - fixed_tokens
+    kept = {name: set() for name in sections}
+    dropped_tokens, dropped_pieces = prefix.dropped_tokens, prefix.dropped_pieces
+
+    for rank in range(max(len(pieces) for pieces in sections.values())):
+        for name in _pack_order():
+            pieces = sections[name]
+            if rank >= len(pieces):
+                continue
+            tokens = counter.count(str(pieces[rank]))
+            if tokens <= remaining:
+                kept[name].add(rank)
+                remaining -= tokens
+            else:
+                dropped_tokens += tokens
+                dropped_pieces += 1
+
+    def keep(name):
+        return [piece for rank, piece in enumerate(sections[name]) if rank in kept[name]]
+
+    used_tokens = budget - remaining
+    packer_counters.add(prompts=1, tokens_dropped=dropped_tokens, pieces_dropped=dropped_pieces)
+    return SimpleNamespace(
+        context=keep(CONTEXT),
+        message_history=keep(HISTORY),
+        budget=budget,
+        used_tokens=used_tokens,
+        dropped_tokens=dropped_tokens,
+        dropped_pieces=dropped_pieces,
+        estimated_cost=get_model_limits(counter.model_name).cost(used_tokens),
+    )
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, List
+
+from langchain.schema import Document
+
+from config import settings
+
+# Bump when loaders or text cleaning change so stale parses are not reused
+PARSER_VERSION = "1"
+READ_BLOCK = 1024 * 1024
+
+
+def file_sha256(file_path) -> str:
+    digest = sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_dir() -> Path:
+    cache_dir = Path(settings.PARSED_DOC_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _cache_path(file_hash: str, kind: str) -> Path:
+    return _cache_dir() / f"{file_hash}.{kind}.v{PARSER_VERSION}.json.gz"
+
+
+def _read(path: Path, file_path: str) -> List[Document]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        entries = json.load(f)
+    os.utime(path)  # keep recently used parses when pruning
+    docs = []
+    for entry in entries:
+        metadata = entry["metadata"]
+        if "source" in metadata:
+            metadata["source"] = str(file_path)
+        docs.append(Document(page_content=entry["page_content"], metadata=metadata))
+    return docs
+
+
+def _write(path: Path, docs: List[Document]):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(
+            [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs], f
+        )
+    os.replace(tmp_path, path)
+
+
+def _prune():
+    """Drop the least recently used parses once the cache outgrows its budget"""
+    entries = []
+    for path in _cache_dir().glob("*.json.gz"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= settings.PARSED_DOC_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def load_parsed_documents(
+    file_path, kind: str, parse: Callable[[], List[Document]]
+) -> List[Document]:
+    """
+    Cleaned documents of a file, parsing it only when these bytes were never
+    parsed before with this loader `kind` and PARSER_VERSION.
+
+    `parse` loads and cleans the file; cached metadata gets the current path as
+    its source, since the same bytes may have been uploaded under another name.
+    """
+    file_hash = file_sha256(file_path)
+    path = _cache_path(file_hash, kind)
+    try:
+        docs = _read(path, file_path)
+        print(f"[DEBUG] Parsed document cache hit for {file_path} ({file_hash[:12]})")
+        return docs
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[WARN] Unreadable parsed document cache entry {path}: {e}")
+
+    docs = parse()
+    if docs:
+        try:
+            _write(path, docs)
+            _prune()
+        except Exception as e:
+            print(f"[WARN] Could not cache parsed document {file_path}: {e}")
+    return docs
@@ -0,0 +1,44 @@
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models.chatModel.chatModel import ChunkEmbedding
+
+BATCH_SIZE = 500
+
+
+def _encode(vector) -> bytes:
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def _decode(raw: bytes) -> List[float]:
+    return np.frombuffer(raw, dtype=np.float16).astype(np.float32).tolist()
+
+
+def lookup_embeddings(db: Session, space: str, content_hashes: List[str]) -> Dict[str, List[float]]:
+    """content_hash -> vector for the chunks already embedded in this space"""
+    found = {}
+    hashes = list(dict.fromkeys(content_hashes))
+    for i in range(0, len(hashes), BATCH_SIZE):
+        rows = (
+            db.query(ChunkEmbedding.content_hash, ChunkEmbedding.vector)
+            .filter(
+                ChunkEmbedding.embedding_space == space,
+                ChunkEmbedding.content_hash.in_(hashes[i : i + BATCH_SIZE]),
+            )
+            .all()
+        )
+        found.update({row.content_hash: _decode(row.vector) for row in rows})
+    return found
+
+
+def save_embeddings(db: Session, space: str, vectors: Dict[str, List[float]]):
+    """Store new vectors (float16) in the caller's transaction; existing hashes are kept"""
+    rows = [
+        {"embedding_space": space, "content_hash": content_hash, "vector": _encode(vector)}
+        for content_hash, vector in vectors.items()
+    ]
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(ChunkEmbedding).prefix_with("IGNORE"), rows[i : i + BATCH_SIZE])
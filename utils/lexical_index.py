@@ -0,0 +1,277 @@
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+from filelock import FileLock
+
+from config import settings
+
+TOKEN_RE = re.compile(r"\w+")
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _pack(strings: Iterable[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack(packed: np.ndarray) -> List[str]:
+    text = packed.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+class LexicalIndex:
+    """
+    BM25 (Okapi) index over one bot's chunks, keyed by Pinecone vector id.
+
+    Postings are persisted doc-major (doc_offsets / term_ids / tfs), which makes
+    appending and removing documents cheap; the term-major inverted view used
+    for scoring is derived with one argsort when the index is loaded.
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        doc_ids: List[str],
+        doc_offsets: np.ndarray,
+        term_ids: np.ndarray,
+        tfs: np.ndarray,
+    ):
+        self.vocab = vocab
+        self.term_lookup = {term: i for i, term in enumerate(vocab)}
+        self.doc_ids = doc_ids
+        self.doc_lookup = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self.doc_offsets = np.asarray(doc_offsets, dtype=np.int64)
+        self.term_ids = np.asarray(term_ids, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.int32)
+        self._build_inverted()
+
+    @classmethod
+    def empty(cls) -> "LexicalIndex":
+        return cls([], [], np.zeros(1, dtype=np.int64), np.zeros(0), np.zeros(0))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _build_inverted(self):
+        n_docs = len(self.doc_ids)
+        postings_per_doc = np.diff(self.doc_offsets)
+        posting_docs = np.repeat(np.arange(n_docs, dtype=np.int32), postings_per_doc)
+
+        order = np.argsort(self.term_ids, kind="stable")
+        self.post_docs = posting_docs[order]
+        self.post_tfs = self.tfs[order].astype(np.float32)
+
+        df = np.bincount(self.term_ids, minlength=len(self.vocab))
+        self.term_offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        self.idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1.0).astype(np.float32)
+
+        self.doc_lens = np.bincount(
+            posting_docs, weights=self.tfs, minlength=n_docs
+        ).astype(np.float32)
+        self.avgdl = float(self.doc_lens.mean()) if n_docs else 0.0
+
+    def add_documents(self, docs: Dict[str, str]) -> "LexicalIndex":
+        """New index with `docs` (vector id -> text) added or replaced"""
+        base = self.remove_documents([doc_id for doc_id in docs if doc_id in self.doc_lookup])
+        vocab = list(base.vocab)
+        term_lookup = dict(base.term_lookup)
+        doc_ids = list(base.doc_ids)
+        offsets = [base.doc_offsets]
+        term_chunks = [base.term_ids]
+        tf_chunks = [base.tfs]
+        end = int(base.doc_offsets[-1])
+
+        for doc_id, text in docs.items():
+            counts = Counter(tokenize(text))
+            ids = []
+            for term in counts:
+                if term not in term_lookup:
+                    term_lookup[term] = len(vocab)
+                    vocab.append(term)
+                ids.append(term_lookup[term])
+            doc_ids.append(doc_id)
+            term_chunks.append(np.asarray(ids, dtype=np.int32))
+            tf_chunks.append(np.fromiter(counts.values(), dtype=np.int32, count=len(counts)))
+            end += len(counts)
+            offsets.append(np.asarray([end], dtype=np.int64))
+
+        return LexicalIndex(
+            vocab,
+            doc_ids,
+            np.concatenate(offsets),
+            np.concatenate(term_chunks),
+            np.concatenate(tf_chunks),
+        )
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> "LexicalIndex":
+        drop = {self.doc_lookup[doc_id] for doc_id in doc_ids if doc_id in self.doc_lookup}
+        if not drop:
+            return self
+        keep_docs = np.ones(len(self.doc_ids), dtype=bool)
+        keep_docs[list(drop)] = False
+
+        postings_per_doc = np.diff(self.doc_offsets)
+        keep_postings = np.repeat(keep_docs, postings_per_doc)
+        doc_offsets = np.concatenate(([0], np.cumsum(postings_per_doc[keep_docs])))
+        return LexicalIndex(
+            self.vocab,
+            [doc_id for i, doc_id in enumerate(self.doc_ids) if keep_docs[i]],
+            doc_offsets,
+            self.term_ids[keep_postings],
+            self.tfs[keep_postings],
+        )
+
+    def _scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        if not self.doc_ids:
+            return scores
+        norm = K1 * (1 - B + B * self.doc_lens / self.avgdl) if self.avgdl else K1
+        for term in tokenize(query):
+            term_id = self.term_lookup.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.post_docs[start:end]
+            tf = self.post_tfs[start:end]
+            doc_norm = norm[docs] if isinstance(norm, np.ndarray) else norm
+            scores[docs] += self.idf[term_id] * tf * (K1 + 1) / (tf + doc_norm)
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Best `top_k` (vector id, BM25 score) pairs with a positive score"""
+        scores = self._scores(query)
+        if not len(scores) or top_k <= 0:
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.doc_ids[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def score(self, query: str, doc_ids: List[str]) -> np.ndarray:
+        """BM25 scores of specific vector ids (0 for ids not in the index)"""
+        scores = self._scores(query)
+        return np.asarray(
+            [
+                scores[self.doc_lookup[doc_id]] if doc_id in self.doc_lookup else 0.0
+                for doc_id in doc_ids
+            ],
+            dtype=np.float32,
+        )
+
+    def similarity(self, doc_ids: List[str]) -> np.ndarray:
+        """Pairwise TF-IDF cosine similarity of vector ids (rows of ids not indexed are 0)"""
+        rows, terms, weights = [], [], []
+        for row, doc_id in enumerate(doc_ids):
+            doc = self.doc_lookup.get(doc_id)
+            if doc is None:
+                continue
+            start, end = self.doc_offsets[doc], self.doc_offsets[doc + 1]
+            rows.append(np.full(end - start, row, dtype=np.int32))
+            terms.append(self.term_ids[start:end])
+            weights.append(self.tfs[start:end] * self.idf[self.term_ids[start:end]])
+
+        if not rows:
+            return np.zeros((len(doc_ids), len(doc_ids)), dtype=np.float32)
+        columns, term_columns = np.unique(np.concatenate(terms), return_inverse=True)
+        matrix = np.zeros((len(doc_ids), len(columns)), dtype=np.float32)
+        matrix[np.concatenate(rows), term_columns] = np.concatenate(weights)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix @ matrix.T
+
+    def save(self, path: Path):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vocab=_pack(self.vocab),
+                doc_ids=_pack(self.doc_ids),
+                doc_offsets=self.doc_offsets,
+                term_ids=self.term_ids,
+                tfs=self.tfs,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        with np.load(path) as data:
+            return cls(
+                _unpack(data["vocab"]),
+                _unpack(data["doc_ids"]),
+                data["doc_offsets"],
+                data["term_ids"],
+                data["tfs"],
+            )
+
+
+_loaded = LRUCache(maxsize=256)
+_loaded_lock = threading.Lock()
+
+
+def _index_path(bot_id: int) -> Path:
+    index_dir = Path(settings.LEXICAL_INDEX_DIR)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    return index_dir / f"bot_{bot_id}.npz"
+
+
+def _lock(bot_id: int) -> FileLock:
+    return FileLock(str(_index_path(bot_id).with_suffix(".lock")))
+
+
+def get_lexical_index(bot_id: int) -> Optional[LexicalIndex]:
+    """Index for the bot, reloaded when another process has rewritten it; None if never built"""
+    path = _index_path(bot_id)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _loaded_lock:
+        cached = _loaded.get(bot_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    index = LexicalIndex.load(path)
+    with _loaded_lock:
+        _loaded[bot_id] = (mtime, index)
+    return index
+
+
+def _update(bot_id: int, change):
+    path = _index_path(bot_id)
+    with _lock(bot_id):
+        current = LexicalIndex.load(path) if path.exists() else LexicalIndex.empty()
+        updated = change(current)
+        updated.save(path)
+    with _loaded_lock:
+        _loaded.pop(bot_id, None)
+    return updated
+
+
+def add_to_lexical_index(bot_id: int, docs: Dict[str, str]):
+    if docs:
+        index = _update(bot_id, lambda current: current.add_documents(docs))
+        print(f"[DEBUG] Lexical index for bot {bot_id}: {len(index)} chunks")
+
+
+def remove_from_lexical_index(bot_id: int, vector_ids: List[str]):
+    if vector_ids:
+        index = _update(bot_id, lambda current: current.remove_documents(vector_ids))
+        print(f"[DEBUG] Lexical index for bot {bot_id}: {len(index)} chunks")
+
+
+def rebuild_lexical_index(bot_id: int, docs: Dict[str, str]) -> LexicalIndex:
+    """Replace the bot's index with `docs`, e.g. to backfill bots trained earlier"""
+    return _update(bot_id, lambda current: LexicalIndex.empty().add_documents(docs))
@@ -0,0 +1,69 @@
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+_recorders = []
+_counters = []
+
+
+class LatencyRecorder:
+    """Rolling per-stage latency samples (milliseconds) for the last `window` calls"""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        _recorders.append(self)
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            self._samples[stage].append(ms)
+
+    def record_all(self, timings: dict):
+        with self._lock:
+            for stage, ms in timings.items():
+                self._samples[stage].append(ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        stages = {}
+        for stage, values in samples.items():
+            if not values:
+                continue
+            array = np.asarray(values)
+            stages[stage] = {
+                "count": len(values),
+                "mean_ms": round(float(array.mean()), 2),
+                "p50_ms": round(float(np.percentile(array, 50)), 2),
+                "p95_ms": round(float(np.percentile(array, 95)), 2),
+            }
+        return {"name": self.name, "stages": stages}
+
+
+def latency_stats() -> list:
+    return [recorder.summary() for recorder in _recorders]
+
+
+class Counters:
+    """Running totals (requests, tokens saved, ...) kept since process start"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._totals = defaultdict(int)
+        self._lock = threading.Lock()
+        _counters.append(self)
+
+    def add(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._totals[key] += amount
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "totals": dict(self._totals)}
+
+
+def counter_stats() -> list:
+    return [counters.summary() for counters in _counters]
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """Context window, output cap and list price (USD per 1M tokens) of an LLM"""
+
+    context_window: int
+    max_output_tokens: int
+    input_price: float
+    output_price: float
+
+    def cost(self, input_tokens: int, output_tokens: int = 0) -> float:
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+
+# Keyed by model name prefix; the longest matching prefix wins, so dated and
+# preview releases share their family's entry. Update prices when providers do.
+MODEL_LIMITS = {
+    "gpt-3.5-turbo": ModelLimits(16_385, 4_096, 0.50, 1.50),
+    "gpt-4": ModelLimits(8_192, 4_096, 30.00, 60.00),
+    "gpt-4-turbo": ModelLimits(128_000, 4_096, 10.00, 30.00),
+    "gpt-4o": ModelLimits(128_000, 16_384, 2.50, 10.00),
+    "gpt-4o-mini": ModelLimits(128_000, 16_384, 0.15, 0.60),
+    "gpt-4.1": ModelLimits(1_047_576, 32_768, 2.00, 8.00),
+    "gpt-4.1-mini": ModelLimits(1_047_576, 32_768, 0.40, 1.60),
+    "gpt-4.1-nano": ModelLimits(1_047_576, 32_768, 0.10, 0.40),
+    "gemini-pro": ModelLimits(32_760, 8_192, 0.50, 1.50),
+    "gemini-1.0-pro": ModelLimits(32_760, 8_192, 0.50, 1.50),
+    "gemini-1.5-pro": ModelLimits(2_097_152, 8_192, 1.25, 5.00),
+    "gemini-1.5-flash": ModelLimits(1_048_576, 8_192, 0.075, 0.30),
+    "gemini-1.5-flash-8b": ModelLimits(1_048_576, 8_192, 0.0375, 0.15),
+    "gemini-2.0-flash": ModelLimits(1_048_576, 8_192, 0.10, 0.40),
+    "gemini-2.0-flash-lite": ModelLimits(1_048_576, 8_192, 0.075, 0.30),
+    "gemini-2.5-pro": ModelLimits(1_048_576, 65_536, 1.25, 10.00),
+    "gemini-2.5-flash": ModelLimits(1_048_576, 65_536, 0.30, 2.50),
+    "deepseek-chat": ModelLimits(65_536, 8_192, 0.27, 1.10),
+    "deepseek-reasoner": ModelLimits(65_536, 8_192, 0.55, 2.19),
+}
+DEFAULT_LIMITS = ModelLimits(8_192, 1_024, 0.0, 0.0)
+
+
+@lru_cache(maxsize=None)
+def get_model_limits(model_name: str) -> ModelLimits:
+    name = (model_name or "").lower()
+    if name.startswith("models/"):
+        name = name[len("models/") :]
+    matches = [prefix for prefix in MODEL_LIMITS if name.startswith(prefix)]
+    if not matches:
+        print(f"[WARN] No limits registered for model {model_name}, using defaults")
+        return DEFAULT_LIMITS
+    return MODEL_LIMITS[max(matches, key=len)]
@@ -0,0 +1,72 @@
+from typing import List
+
+import numpy as np
+
+WEIGHTED = "weighted"
+RRF = "rrf"
+
+
+def _max_normalize(scores: np.ndarray) -> np.ndarray:
+    top = scores.max() if len(scores) else 0
+    return scores / top if top > 0 else scores
+
+
+def _reciprocal_ranks(scores: np.ndarray, k: int) -> np.ndarray:
+    """1 / (k + rank) for every positive score, 0 for candidates the list didn't return"""
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return np.where(scores > 0, 1.0 / (k + ranks), 0.0)
+
+
+def fuse_scores(
+    vector_scores: np.ndarray,
+    text_scores: np.ndarray,
+    method: str = WEIGHTED,
+    vector_weight: float = 0.7,
+    rrf_k: int = 60,
+) -> np.ndarray:
+    """
+    Combine vector and BM25 scores of the same candidates.
+
+    weighted: vector_weight * max-normalized vector score plus the rest for BM25.
+    rrf: reciprocal rank fusion, which ignores score scales entirely.
+    """
+    vector_scores = np.asarray(vector_scores, dtype=np.float64)
+    text_scores = np.asarray(text_scores, dtype=np.float64)
+    if method == RRF:
+        return _reciprocal_ranks(vector_scores, rrf_k) + _reciprocal_ranks(text_scores, rrf_k)
+    return vector_weight * _max_normalize(vector_scores) + (1 - vector_weight) * _max_normalize(
+        text_scores
+    )
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    similarity: np.ndarray,
+    top_k: int,
+    lambda_: float = 0.7,
+    duplicate_threshold: float = 0.85,
+) -> List[int]:
+    """
+    Maximal marginal relevance over candidate indices.
+
+    Picks up to `top_k` candidates, trading relevance against similarity to the
+    ones already picked, and drops candidates whose similarity to a picked one
+    reaches `duplicate_threshold` (overlapping chunks of the same passage).
+    """
+    relevance = _max_normalize(np.asarray(relevance, dtype=np.float64))
+    available = np.ones(len(relevance), dtype=bool)
+    max_similarity = np.zeros(len(relevance), dtype=np.float64)
+    selected = []
+
+    while len(selected) < top_k and available.any():
+        marginal = lambda_ * relevance - (1 - lambda_) * max_similarity
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        available &= max_similarity < duplicate_threshold
+
+    return selected
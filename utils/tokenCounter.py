@@ -1,92 +1,95 @@
-# import os
-# import sys
-# import tiktoken
-# import importlib.metadata
-# import google.generativeai as genai
-# import transformers
-# from transformers import AutoTokenizer
-
-# print(f"App's Python executable: {sys.executable}")
-# print(f"App's sys.path: {sys.path}")
-
-# try:
-#     # Use importlib.metadata to check the version that's actually loaded
-#     package_version = importlib.metadata.version("google-generativeai")
-#     print(f"App's google-generativeai version: {package_version}")
-# except importlib.metadata.PackageNotFoundError:
-#     print("google-generativeai not found in this environment via importlib.metadata.")
-# except Exception as e:
-#     print(f"Could not determine app's google-generativeai version (Error: {e}).")
-
-# def count_tokens(tool: str, model_name: str, text: str) -> int:
-#     """
-#     Count tokens for different LLM tools and models
-#     Supports: ChatGPT, DeepSeek, Gemini
-#     """
-#     # ChatGPT models
-#     if tool == "ChatGPT":
-#         try:
-#             encoder = tiktoken.encoding_for_model(model_name)
-#             return len(encoder.encode(text))
-#         except KeyError:
-#             # Fallback for unknown models
-#             encoder = tiktoken.get_encoding("cl100k_base")
-#             return len(encoder.encode(text))
-    
-#     # DeepSeek models
-#     elif tool == "DeepSeek":
-#         try:
-#             # Try to load a DeepSeek-specific tokenizer
-#             tokenizer = AutoTokenizer.from_pretrained("deepseek-ai/deepseek-llm-7b-base")
-#             return len(tokenizer.encode(text))
-#         except:
-#             # Fallback to ChatGPT tokenizer (similar architecture)
-#             encoder = tiktoken.get_encoding("cl100k_base")
-#             return len(encoder.encode(text))
-    
-#     # Gemini models
-#     elif tool == "Gemini":
-#         # Configure API key (should be in environment)
-#         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        
-#         # Create a generative model instance
-#         model = genai.GenerativeModel(model_name)
-        
-#         # Count tokens using Gemini's built-in method
-#         return model.count_tokens( text).total_tokens
-    
-#     else:
-#         raise ValueError(f"Unsupported tool: {tool}")
-
-
-# # Unified token counter class
-# class TokenCounter:
-#     def __init__(self, tool: str, model_name: str):
-#         self.tool = tool
-#         self.model_name = model_name
-        
-#         # Preload tokenizers for efficiency
-#         if tool == "ChatGPT":
-#             try:
-#                 self.encoder = tiktoken.encoding_for_model(model_name)
-#             except KeyError:
-#                 self.encoder = tiktoken.get_encoding("cl100k_base")
-                
-#         elif tool == "DeepSeek":
-#             try:
-#                 self.tokenizer = AutoTokenizer.from_pretrained("deepseek-ai/deepseek-llm-7b-base")
-#             except:
-#                 self.encoder = tiktoken.get_encoding("cl100k_base")
-    
-#     def count(self, text: str) -> int:
-#         if self.tool == "ChatGPT":
-#             return len(self.encoder.encode(text))
-        
-#         elif self.tool == "DeepSeek":
-#             if hasattr(self, 'tokenizer'):
-#                 return len(self.tokenizer.encode(text))
-#             return len(self.encoder.encode(text))
-        
-#         elif self.tool == "Gemini":
-#             genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-#             return genai.count_tokens(self.model_name, text).total_tokens
\ No newline at end of file
+import math
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import tiktoken
+
+# Counts not tied to a specific completion (summaries, savings) use this model's encoding
+DEFAULT_MODEL = "gpt-3.5-turbo"
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = DEFAULT_MODEL):
+    """
+    tiktoken encoder for the model, loaded once per process.
+
+    Gemini and DeepSeek models are unknown to tiktoken and fall back to
+    cl100k_base; their exact counts come from provider usage metadata instead.
+    """
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model_name: str = DEFAULT_MODEL) -> int:
+    return len(get_encoder(model_name).encode(text)) if text else 0
+
+
+def approx_tokens(text: str) -> int:
+    """~4 characters per token without encoding, for quota pre-checks and estimates"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def usage_from_response(response) -> Optional[Tuple[int, int, int]]:
+    """
+    (input, output, cached input) tokens the provider reported for a
+    completion or chunk, if any. Cached input tokens are the prompt prefix
+    served from the provider's prompt cache.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        details = usage.get("input_token_details") or {}
+        return (
+            usage.get("input_tokens", 0),
+            usage.get("output_tokens", 0),
+            details.get("cache_read", 0) or 0,
+        )
+
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage")
+    if token_usage:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return (
+            token_usage.get("prompt_tokens", 0),
+            token_usage.get("completion_tokens", 0),
+            details.get("cached_tokens") or token_usage.get("prompt_cache_hit_tokens") or 0,
+        )
+    gemini_usage = metadata.get("usage_metadata")
+    if gemini_usage:
+        return (
+            gemini_usage.get("prompt_token_count", 0),
+            gemini_usage.get("candidates_token_count", 0),
+            gemini_usage.get("cached_content_token_count", 0) or 0,
+        )
+    return None
+
+
+class TokenCounter:
+    """
+    Token counts for one request against one model.
+
+    Every distinct string is encoded at most once per counter, so the prompt
+    pieces measured while packing are not encoded again for accounting.
+    """
+
+    def __init__(self, tool: Optional[str], model_name: str):
+        self.tool = tool
+        self.model_name = model_name or DEFAULT_MODEL
+        self.encoder = get_encoder(self.model_name)
+        self._counts: Dict[str, int] = {}
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        tokens = self._counts.get(text)
+        if tokens is None:
+            tokens = self._counts[text] = len(self.encoder.encode(text))
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of `text` that fits in `max_tokens` tokens"""
+        if self.count(text) <= max_tokens:
+            return text
+        return self.encoder.decode(self.encoder.encode(text)[: max(max_tokens, 0)])
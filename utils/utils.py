@@ -1,3 +1,4 @@
+import asyncio
 from base64 import b64encode
 from types import SimpleNamespace
 from cachetools import TTLCache
@@ -8,13 +9,11 @@ from jose import JWTError, jwt
 from typing import Optional
 from sqlalchemy.orm import Session
 from config import get_db
-from models.adminModel.toolsModal import ToolsUsed
 from models.chatModel.sharing import ChatBotSharing
-from models.chatModel.tuning import DBInstructionPrompt
 from routes.chat.pinecone import (
     generate_response,
-    get_response_from_faqs,
     hybrid_retrieval,
+    stream_response,
 )
 from models.authModel.authModel import AuthUser
 from models.chatModel.chatModel import ChatBots, ChatBotsFaqs, ChatSession, ChatMessage
@@ -28,6 +27,16 @@ from routes.subscriptions.token_usage import (
     update_token_usage_on_consumption,
     verify_token_limit_available,
 )
+from utils.admin_settings import get_active_tool
+from utils.answer_cache import apply_cached_answer, cache_answer, find_cached_answer
+from utils.bot_snapshot import BotSnapshot, get_bot_snapshot, invalidate_bot_snapshot
+from utils.char_ledger import adjust_char_usage, bot_owner_id, faq_chars
+from utils.chat_history import (
+    HISTORY_SIZE,
+    append_chat_history,
+    get_chat_history,
+    history_entry,
+)
 import re
 from rapidfuzz import fuzz
 from config import get_db, settings
@@ -40,32 +49,201 @@ RESET_PASSWORD_TOKEN_EXPIRE_MINUTES = 15
 
 
 def get_recent_chat_history(db: Session, chat_id: str):
+    """Newest-first recent messages, from the session's history buffer when warm"""
     if not chat_id:
         return []
 
-    # Get messages (both user and bot) in one query for efficiency
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.chat_id == chat_id, ChatMessage.sender.in_(["user", "bot"]))
-        .order_by(ChatMessage.created_at.desc())
-        .limit(6)  # 3 user + 3 bot messages
-        .all()
+    def load():
+        # Get messages (both user and bot) in one query, via (chat_id, created_at)
+        messages = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.chat_id == chat_id, ChatMessage.sender.in_(["user", "bot"]))
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(HISTORY_SIZE)
+            .all()
+        )
+        return [history_entry(msg.sender, msg.message, msg.created_at) for msg in messages]
+
+    return get_chat_history(chat_id, load)
+
+
+def _load_chat_inputs(db: Session, chatbot: BotSnapshot, chat_id: int, user_msg: str):
+    """Per-message reads, grouped so they cost a single worker-thread hop"""
+    message_history = get_recent_chat_history(chat_id=chat_id, db=db)
+    active_tool = get_active_tool(db)
+    return SimpleNamespace(
+        message_history=message_history,
+        faq_answer=chatbot.faq_answer(user_msg),
+        active_tool=active_tool,
+        instruction_prompts=chatbot.dict_instruction_prompts,
+    )
+
+
+async def _retrieve_generation_args(db: Session, chatbot, inputs, user_msg: str) -> dict:
+    """Run hybrid retrieval and build the kwargs shared by generate/stream_response"""
+    # Hybrid retrieval
+    context_texts, scores = await hybrid_retrieval(
+        query=user_msg, bot_id=chatbot.id, db=db, tool=inputs.active_tool
+    )
+    print("Hybrid retrieval results: ", context_texts, scores)
+
+    # OpenAI with context, or full OpenAI fallback when nothing scored
+    has_context = any(score > 0 for score in scores)
+    return dict(
+        query=user_msg,
+        context=context_texts[:3] if has_context else [],
+        instruction_prompts=inputs.instruction_prompts,
+        creativity=chatbot.creativity,
+        text_content=chatbot.text_content,
+        active_tool=inputs.active_tool,
+        message_history=inputs.message_history,
+    )
+
+
+def _new_reply(faq_answer=None):
+    return SimpleNamespace(
+        response_content=faq_answer,
+        from_faq=bool(faq_answer),
+        from_cache=False,
+        tokens_saved=0,
+        request_tokens=0,
+        openai_request_tokens=0,
+        openai_response_tokens=0,
     )
 
-    # Convert to pure Python dictionaries
-    history = [
-        {
-            "sender": msg.sender,
-            "message": msg.message,
-            "time": msg.created_at.isoformat(),  # ISO 8601 format
-        }
-        for msg in messages
-    ]
 
-    # Sort by time (newest first) just in case
-    history.sort(key=lambda x: x["time"], reverse=True)
+def _remember_reply(cache_lookup, reply):
+    """Only complete, valid answers go into the answer cache"""
+    if reply.openai_response_tokens and validate_response(reply.response_content)[0]:
+        cache_answer(cache_lookup, reply)
 
-    return history
+
+async def generate_chatbot_reply(db: Session, chatbot: BotSnapshot, chat_id: int, user_msg: str):
+    """
+    Answer a user message from FAQs, or from hybrid retrieval + LLM.
+
+    Shared by the widget endpoint and the Slack/WhatsApp/Zapier integrations.
+    Blocking DB work is offloaded to worker threads and the embedding/LLM calls
+    are awaited, so one slow completion doesn't stall other conversations.
+
+    Returns:
+        SimpleNamespace: response_content, from_faq, from_cache, tokens_saved,
+        request_tokens, openai_request_tokens, openai_response_tokens
+    """
+    inputs = await asyncio.to_thread(_load_chat_inputs, db, chatbot, chat_id, user_msg)
+
+    reply = _new_reply(inputs.faq_answer)
+    if reply.from_faq:
+        return reply
+
+    print("No response found from FAQ")
+    cache_lookup = await find_cached_answer(
+        db, chatbot, inputs.active_tool, user_msg, inputs.message_history
+    )
+    if cache_lookup.answer:
+        return apply_cached_answer(reply, cache_lookup, user_msg)
+
+    generation_args = await _retrieve_generation_args(db, chatbot, inputs, user_msg)
+    (
+        reply.response_content,
+        reply.openai_request_tokens,
+        reply.openai_response_tokens,
+        reply.request_tokens,
+    ) = await generate_response(use_openai=True, **generation_args)
+    print("ANSWER", reply.response_content, reply.openai_request_tokens)
+    _remember_reply(cache_lookup, reply)
+    return reply
+
+
+async def stream_chatbot_reply(db: Session, chatbot: BotSnapshot, chat_id: int, user_msg: str):
+    """
+    Streaming variant of generate_chatbot_reply.
+
+    Yields ("token", str) events as text becomes available and finishes with
+    ("done", reply) where reply has the same fields generate_chatbot_reply
+    returns. FAQ and cached answers are emitted as a single token.
+    """
+    inputs = await asyncio.to_thread(_load_chat_inputs, db, chatbot, chat_id, user_msg)
+
+    reply = _new_reply(inputs.faq_answer)
+    if reply.from_faq:
+        yield "token", reply.response_content
+        yield "done", reply
+        return
+
+    cache_lookup = await find_cached_answer(
+        db, chatbot, inputs.active_tool, user_msg, inputs.message_history
+    )
+    if cache_lookup.answer:
+        apply_cached_answer(reply, cache_lookup, user_msg)
+        yield "token", reply.response_content
+        yield "done", reply
+        return
+
+    generation_args = await _retrieve_generation_args(db, chatbot, inputs, user_msg)
+    async for event, payload in stream_response(**generation_args):
+        if event == "token":
+            yield event, payload
+        else:
+            (
+                reply.response_content,
+                reply.openai_request_tokens,
+                reply.openai_response_tokens,
+                reply.request_tokens,
+            ) = payload
+    _remember_reply(cache_lookup, reply)
+    yield "done", reply
+
+
+def _get_or_create_platform_session(db: Session, token: str, platform: str, bot_id: int):
+    chat = db.query(ChatSession).filter_by(token=token).first()
+    if not chat:
+        chat = ChatSession(token=token, platform=platform, bot_id=bot_id)
+        db.add(chat)
+        db.commit()
+    return chat
+
+
+def _save_platform_exchange(db: Session, chat, bot_id: int, platform: str, user_msg: str, reply):
+    user_message = ChatMessage(
+        bot_id=bot_id, chat_id=chat.id, sender="user", message=user_msg
+    )
+    bot_message = ChatMessage(
+        bot_id=bot_id,
+        chat_id=chat.id,
+        sender="bot",
+        message=reply.response_content,
+        from_cache=reply.from_cache,
+        tokens_saved=reply.tokens_saved,
+    )
+
+    db.add_all([user_message, bot_message])
+    db.commit()
+    db.refresh(bot_message)
+    # Both rows come from the same insert; the bot row's timestamp stands for both
+    append_chat_history(
+        chat.id,
+        [
+            history_entry("bot", reply.response_content, bot_message.created_at),
+            history_entry("user", user_msg, bot_message.created_at),
+        ],
+    )
+
+    # Update Token consumption
+    consumed_token = SimpleNamespace(
+        request_token=reply.request_tokens,
+        response_token=reply.openai_response_tokens,
+        open_ai_request_token=reply.openai_request_tokens,
+        open_ai_response_token=reply.openai_response_tokens,
+        request_message=1,
+        response_message=1,
+    )
+    update_token_usage_on_consumption(
+        consumed_token=consumed_token,
+        consumed_token_type=f"{platform}_bot",
+        bot_id=bot_id,
+        db=db,
+    )
 
 
 async def get_response_from_chatbot(data, platform, db: Session):
@@ -78,8 +256,8 @@ async def get_response_from_chatbot(data, platform, db: Session):
         if not user_msg:
             raise HTTPException(status_code=400, detail="Message required")
 
-        token_limit_availabe, message = verify_token_limit_available(
-            bot_id=bot_id, db=db
+        token_limit_availabe, message = await asyncio.to_thread(
+            verify_token_limit_available, bot_id, db
         )
         print("Checking Message limit:",token_limit_availabe, message)
         if not token_limit_availabe:
@@ -89,134 +267,23 @@ async def get_response_from_chatbot(data, platform, db: Session):
             print("Message limit exceeded")
             return "Sorry can't reply you at the moment, Message Limit exceeded"
 
-        chatbot = db.query(ChatBots).filter(ChatBots.id == bot_id).first()
+        chatbot = await asyncio.to_thread(get_bot_snapshot, db, bot_id)
         if not chatbot:
             raise HTTPException(status_code=404, detail="ChatBot not found")
 
-        chat = db.query(ChatSession).filter_by(token=token).first()
-        if not chat:
-            chat = ChatSession(token=token, platform=platform, bot_id=bot_id)
-            db.add(chat)
-            db.commit()
-
-        message_history = get_recent_chat_history(chat_id=chat.id, db=db)
-
-        (
-            request_tokens,
-            response_tokens,
-            openai_request_tokens,
-            openai_response_tokens,
-        ) = (0, 0, 0, 0)
-        response_from_faqs = get_response_from_faqs(user_msg, bot_id, db)
-
-        response_content = response_from_faqs.answer if response_from_faqs else None
-
-        active_tool = db.query(ToolsUsed).filter_by(status=True).first()
-        if not response_content:
-            print("No response found from FAQ")
-            # Hybrid retrieval
-            context_texts, scores = hybrid_retrieval(
-                query=user_msg, bot_id=bot_id, db=db, tool=active_tool
-            )
-
-            instruction_prompts = (
-                db.query(DBInstructionPrompt)
-                .filter(DBInstructionPrompt.bot_id == bot_id)
-                .all()
-            )
-            dict_ins_prompt = [
-                {prompt.type: prompt.prompt} for prompt in instruction_prompts
-            ]
-            # print("DICT INSTRUCTION PROMPTS",dict_ins_prompt)
-
-            creativity = chatbot.creativity
-            text_content = chatbot.text_content
-
-            answer = None
-            print("Hybrid retrieval results: ", context_texts, scores)
-            # Determine answer source
-
-            if any(score > 0 for score in scores):
-                print("using openai with context")
-                use_openai = True
-                generated_res = generate_response(
-                        query=user_msg,
-                        context=context_texts[:3],
-                        use_openai=use_openai,
-                        instruction_prompts=dict_ins_prompt,
-                        creativity=creativity,
-                        text_content=text_content,
-                        active_tool=active_tool,
-                        message_history=message_history,
-                    )
-                answer = generated_res[0]
-                openai_request_tokens = generated_res[1]
-                openai_response_tokens = generated_res[2]
-                request_tokens = generated_res[3]
-                print("ANSWER", answer, openai_request_tokens)
+        chat = await asyncio.to_thread(
+            _get_or_create_platform_session, db, token, platform, bot_id
+        )
 
-            else:
-                print(
-                    "no direct scores from hybrid retrieval and using openai independently"
-                )
-                # Full OpenAI fallback
-                use_openai = True
-                print("CALLING: generate_response")
-                try:
-                    generated_res = generate_response(
-                        query=user_msg,
-                        context=[],
-                        use_openai=use_openai,
-                        instruction_prompts=dict_ins_prompt,
-                        creativity=creativity,
-                        text_content=text_content,
-                        active_tool=active_tool,
-                        message_history=message_history,
-                    )
-                except Exception as e:
-                    print(f"some exception in generate response occur:{e}")
-                answer = generated_res[0]
-                
-                print(f"Answer from generate_response: {answer}")
-                openai_request_tokens = generated_res[1]
-                openai_response_tokens = generated_res[2]
-                request_tokens = generated_res[3]
-                print("ANSWER", answer, openai_request_tokens)
-
-            response_content = answer if answer else response_content
-
-            user_message = ChatMessage(
-                bot_id=bot_id, chat_id=chat.id, sender="user", message=user_msg
-            )
-            bot_message = ChatMessage(
-                bot_id=bot_id, chat_id=chat.id, sender="bot", message=response_content
-            )
+        reply = await generate_chatbot_reply(
+            db=db, chatbot=chatbot, chat_id=chat.id, user_msg=user_msg
+        )
 
-            db.add_all([user_message, bot_message])
-            db.commit()
-            db.refresh(bot_message)
-
-            # Update Token consumption
-            bot_message.input_tokens = request_tokens
-            bot_message.output_tokens = openai_response_tokens
-            bot_message.open_ai_request_tokens = openai_request_tokens
-            bot_message.open_ai_response_tokens = openai_response_tokens
-
-            consumed_token = SimpleNamespace(
-                request_token=request_tokens,
-                response_token=openai_response_tokens,
-                open_ai_request_token=openai_request_tokens,
-                open_ai_response_token=openai_response_tokens,
-                request_message=1,
-                response_message=1,
-            )
-            update_token_usage_on_consumption(
-                consumed_token=consumed_token,
-                consumed_token_type=f"{platform}_bot",
-                bot_id=bot_id,
-                db=db,
+        if not reply.from_faq:
+            await asyncio.to_thread(
+                _save_platform_exchange, db, chat, bot_id, platform, user_msg, reply
             )
-        return html_to_whatsapp_format(response_content)
+        return html_to_whatsapp_format(reply.response_content)
 
     except HTTPException as http_exc:
         raise http_exc
@@ -568,6 +635,7 @@ def handle_invalid_response(question, user_id, bot_id, db, response=None, reason
         if existing_faq:
             return existing_faq
 
+        adjust_char_usage(db, bot_owner_id(db, bot_id), faq_chars=faq_chars(question, None))
         new_faq = ChatBotsFaqs(
             question=question,
             answer=None,
@@ -578,6 +646,7 @@ def handle_invalid_response(question, user_id, bot_id, db, response=None, reason
         db.add(new_faq)
         db.commit()
         db.refresh(new_faq)
+        invalidate_bot_snapshot(bot_id)
         
         print(f"Saved invalid response to FAQs - Question: {question[:50]}...")
         return new_faq
@@ -0,0 +1,479 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+from filelock import FileLock
+
+from config import settings
+from utils.cache import TieredCache
+from utils.clients import get_client
+from utils.embeddings import TARGET_DIM
+
+VECTOR_DIMENSION = TARGET_DIM
+METRIC = "cosine"
+FETCH_BATCH_SIZE = 100
+
+# Write version per namespace, shared through Redis when configured, so every
+# worker notices that its in-process copy of a bot's vectors is stale. Without
+# Redis a bump only reaches the writing process; TieredVectorStore copies also
+# expire after IN_PROCESS_VECTORS_TTL to cover that.
+namespace_versions = TieredCache(
+    namespace="vector_namespace_version",
+    maxsize=10000,
+    ttl=7 * 24 * 3600,
+)
+
+
+class VectorStore(ABC):
+    """
+    Namespaced vector storage used for training and retrieval.
+
+    Every bot lives in its own namespace (bot_<id>). Vectors are passed as
+    {"id", "values", "metadata"} dicts, queries return (vector id, score) pairs
+    with cosine similarity scores.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def upsert(self, namespace: str, vectors: List[dict]) -> int:
+        ...
+
+    @abstractmethod
+    def query(self, namespace: str, vector, top_k: int) -> List[Tuple[str, float]]:
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def delete_namespace(self, namespace: str):
+        ...
+
+    @abstractmethod
+    def namespace_stats(self) -> dict:
+        """{"total_vector_count": int, "namespaces": {name: {"vector_count": int}}}"""
+        ...
+
+    @abstractmethod
+    def list_ids(self, namespace: str, limit: int) -> List[str]:
+        """Up to `limit` vector ids of the namespace"""
+        ...
+
+    @abstractmethod
+    def fetch(self, namespace: str, ids: List[str]) -> Dict[str, List[float]]:
+        ...
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _cosine_top_k(ids: List[str], matrix: np.ndarray, vector, top_k: int):
+    """Best `top_k` rows of an L2-normalized matrix by one matrix-vector product"""
+    if not ids or top_k <= 0:
+        return []
+    query = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return []
+    scores = matrix @ (query / norm)
+
+    top_k = min(top_k, len(ids))
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    best = best[np.argsort(-scores[best])]
+    return [(ids[i], float(scores[i])) for i in best]
+
+
+class PineconeVectorStore(VectorStore):
+    """Pinecone serverless index; connects (and creates the index) on first use"""
+
+    name = "pinecone"
+
+    def __init__(self, index_name: str, api_key: Optional[str]):
+        self.index_name = index_name
+        self.api_key = api_key
+
+    @property
+    def index(self):
+        return get_client(("pinecone_index", self.index_name), self._connect)
+
+    def _connect(self):
+        import pinecone
+        from pinecone import ServerlessSpec
+
+        pc = pinecone.Pinecone(api_key=self.api_key)
+        spec = ServerlessSpec(cloud="aws", region="us-east-1")
+
+        existing_indexes = [i.get("name") for i in pc.list_indexes()]
+        print("EXISTING INEXES: ", existing_indexes)
+
+        if self.index_name in existing_indexes:
+            current_dimension = pc.describe_index(self.index_name).dimension
+            if current_dimension != VECTOR_DIMENSION:
+                print(
+                    f"⚠️ Index '{self.index_name}' has dimension {current_dimension}, expected {VECTOR_DIMENSION}. Deleting and recreating..."
+                )
+                # pc.delete_index(self.index_name)
+                pc.create_index(
+                    name=self.index_name, dimension=VECTOR_DIMENSION, metric=METRIC, spec=spec
+                )
+                print(f"✅ Index '{self.index_name}' recreated with dimension {VECTOR_DIMENSION}")
+            else:
+                print(
+                    f"✅ Index '{self.index_name}' already has correct dimension {VECTOR_DIMENSION}"
+                )
+        else:
+            print(f"ℹ️ Index '{self.index_name}' does not exist. Creating it...")
+            pc.create_index(
+                name=self.index_name, dimension=VECTOR_DIMENSION, metric=METRIC, spec=spec
+            )
+            print(f"✅ Index '{self.index_name}' created with dimension {VECTOR_DIMENSION}")
+
+        return pc.Index(self.index_name)
+
+    def upsert(self, namespace: str, vectors: List[dict]) -> int:
+        response = self.index.upsert(vectors=vectors, namespace=namespace)
+        return getattr(response, "upserted_count", len(vectors))
+
+    def query(self, namespace: str, vector, top_k: int) -> List[Tuple[str, float]]:
+        results = self.index.query(
+            vector=list(vector),
+            top_k=top_k,
+            namespace=namespace,
+            include_metadata=False,
+        )
+        return [(match.id, match.score) for match in getattr(results, "matches", None) or []]
+
+    def delete(self, namespace: str, ids: List[str]):
+        self.index.delete(ids=ids, namespace=namespace)
+
+    def delete_namespace(self, namespace: str):
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def namespace_stats(self) -> dict:
+        index_stats = self.index.describe_index_stats()
+        return {
+            "total_vector_count": index_stats["total_vector_count"],
+            "namespaces": {
+                name: {"vector_count": summary["vector_count"]}
+                for name, summary in index_stats["namespaces"].items()
+            },
+        }
+
+    def list_ids(self, namespace: str, limit: int) -> List[str]:
+        ids = []
+        for page in self.index.list(namespace=namespace):
+            ids.extend(page)
+            if len(ids) >= limit:
+                break
+        return ids[:limit]
+
+    def fetch(self, namespace: str, ids: List[str]) -> Dict[str, List[float]]:
+        vectors = {}
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = self.index.fetch(ids=ids[i : i + FETCH_BATCH_SIZE], namespace=namespace)
+            vectors.update(
+                {vector_id: vector.values for vector_id, vector in response.vectors.items()}
+            )
+        return vectors
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vectors kept on local disk, one directory per namespace, searched with NumPy.
+
+    Each write produces a new generation (g<id>.npy with L2-normalized float32 rows
+    plus g<id>.ids.json) and then moves the `current` pointer, so readers never see
+    a half-written namespace. Matrices are memory-mapped, so the page cache is
+    shared between workers and only touched pages are resident.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._loaded: Dict[str, Tuple[str, List[str], np.ndarray]] = {}
+        self._loaded_lock = threading.Lock()
+
+    def _namespace_dir(self, namespace: str) -> Path:
+        return self.root / namespace
+
+    def _lock(self, namespace: str) -> FileLock:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return FileLock(str(self.root / f"{namespace}.lock"))
+
+    @staticmethod
+    def _current_generation(ns_dir: Path) -> Optional[str]:
+        try:
+            return (ns_dir / "current").read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load(self, namespace: str) -> Tuple[List[str], np.ndarray]:
+        """(ids, matrix) of the namespace's current generation, empty if never written"""
+        ns_dir = self._namespace_dir(namespace)
+        generation = self._current_generation(ns_dir)
+        if generation is None:
+            return [], np.zeros((0, VECTOR_DIMENSION), dtype=np.float32)
+
+        with self._loaded_lock:
+            cached = self._loaded.get(namespace)
+        if cached and cached[0] == generation:
+            return cached[1], cached[2]
+
+        try:
+            with open(ns_dir / f"{generation}.ids.json") as f:
+                ids = json.load(f)
+            matrix = np.load(ns_dir / f"{generation}.npy", mmap_mode="r")
+        except FileNotFoundError:
+            # A writer replaced the generation between reading the pointer and opening it
+            return self._load(namespace)
+        with self._loaded_lock:
+            self._loaded[namespace] = (generation, ids, matrix)
+        return ids, matrix
+
+    def _write(self, namespace: str, ids: List[str], matrix: np.ndarray):
+        ns_dir = self._namespace_dir(namespace)
+        ns_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._current_generation(ns_dir)
+        # Never reused, even after delete_namespace, so another process's cached
+        # generation can't match a pointer written for different vectors
+        generation = f"g{uuid.uuid4().hex}"
+
+        np.save(ns_dir / f"{generation}.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(ns_dir / f"{generation}.ids.json", "w") as f:
+            json.dump(ids, f)
+        tmp_pointer = ns_dir / f"current.{os.getpid()}.tmp"
+        tmp_pointer.write_text(generation)
+        os.replace(tmp_pointer, ns_dir / "current")
+
+        # Open memory maps of the old generation stay valid after unlink
+        if previous:
+            for suffix in (".npy", ".ids.json"):
+                (ns_dir / f"{previous}{suffix}").unlink(missing_ok=True)
+
+    def upsert(self, namespace: str, vectors: List[dict]) -> int:
+        if not vectors:
+            return 0
+        new_ids = [str(vector["id"]) for vector in vectors]
+        new_matrix = _normalize(
+            np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        )
+        with self._lock(namespace):
+            ids, matrix = self._load(namespace)
+            replaced = set(new_ids)
+            keep = np.fromiter((i not in replaced for i in ids), dtype=bool, count=len(ids))
+            self._write(
+                namespace,
+                [i for i, kept in zip(ids, keep) if kept] + new_ids,
+                np.concatenate([matrix[keep], new_matrix]),
+            )
+        return len(vectors)
+
+    def query(self, namespace: str, vector, top_k: int) -> List[Tuple[str, float]]:
+        ids, matrix = self._load(namespace)
+        return _cosine_top_k(ids, matrix, vector, top_k)
+
+    def delete(self, namespace: str, ids: List[str]):
+        dropped = set(map(str, ids))
+        with self._lock(namespace):
+            current_ids, matrix = self._load(namespace)
+            keep = np.fromiter(
+                (i not in dropped for i in current_ids), dtype=bool, count=len(current_ids)
+            )
+            if keep.all():
+                return
+            self._write(
+                namespace,
+                [i for i, kept in zip(current_ids, keep) if kept],
+                matrix[keep],
+            )
+
+    def delete_namespace(self, namespace: str):
+        with self._lock(namespace):
+            shutil.rmtree(self._namespace_dir(namespace), ignore_errors=True)
+        with self._loaded_lock:
+            self._loaded.pop(namespace, None)
+
+    def namespace_stats(self) -> dict:
+        namespaces = {}
+        if self.root.exists():
+            for ns_dir in sorted(p for p in self.root.iterdir() if p.is_dir()):
+                ids, _ = self._load(ns_dir.name)
+                namespaces[ns_dir.name] = {"vector_count": len(ids)}
+        return {
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+            "namespaces": namespaces,
+        }
+
+    def list_ids(self, namespace: str, limit: int) -> List[str]:
+        ids, _ = self._load(namespace)
+        return ids[:limit]
+
+    def fetch(self, namespace: str, ids: List[str]) -> Dict[str, List[float]]:
+        current_ids, matrix = self._load(namespace)
+        wanted = set(ids)
+        return {
+            vector_id: matrix[i].tolist()
+            for i, vector_id in enumerate(current_ids)
+            if vector_id in wanted
+        }
+
+
+class TieredVectorStore(VectorStore):
+    """
+    Remote store fronted by in-process matrices for small namespaces.
+
+    Namespaces with at most `max_vectors` vectors are copied into memory once
+    (list + fetch from the remote store) and answered with a single
+    matrix-vector product; larger ones always go to the remote index. Every
+    write bumps the namespace version in a shared cache, which makes each
+    worker rebuild its copy in the background on its next query and serve
+    from the remote index meanwhile.
+
+    Copies older than `max_age` seconds are rebuilt as well. Versions are
+    only shared between processes through Redis, and a build started right
+    after a write may list an eventually consistent remote index that does
+    not show the new vectors yet; the age limit bounds how long either case
+    serves an incomplete copy.
+    """
+
+    name = "tiered"
+
+    def __init__(self, remote: VectorStore, max_vectors: int, max_bytes: int, max_age: int):
+        self.remote = remote
+        self.max_vectors = max_vectors
+        self.max_age = max_age
+        # namespace -> (version, ids, matrix, built_at); ids is None for namespaces too large to keep
+        self._matrices = LRUCache(
+            maxsize=max_bytes,
+            getsizeof=lambda entry: entry[2].nbytes if entry[2] is not None else 1,
+        )
+        self._lock = threading.Lock()
+        self._building = set()
+
+    def _version(self, namespace: str) -> str:
+        return namespace_versions.get(namespace) or "0"
+
+    def _changed(self, namespace: str):
+        namespace_versions.set(namespace, str(time.time_ns()))
+
+    def upsert(self, namespace: str, vectors: List[dict]) -> int:
+        count = self.remote.upsert(namespace, vectors)
+        self._changed(namespace)
+        return count
+
+    def _is_current(self, entry, version: str) -> bool:
+        if not entry or entry[0] != version:
+            return False
+        return time.monotonic() - entry[3] < self.max_age
+
+    def query(self, namespace: str, vector, top_k: int) -> List[Tuple[str, float]]:
+        version = self._version(namespace)
+        with self._lock:
+            entry = self._matrices.get(namespace)
+        if self._is_current(entry, version):
+            if entry[1] is not None:
+                return _cosine_top_k(entry[1], entry[2], vector, top_k)
+        else:
+            self._schedule_build(namespace, version)
+        return self.remote.query(namespace, vector, top_k)
+
+    def _schedule_build(self, namespace: str, version: str):
+        with self._lock:
+            if namespace in self._building:
+                return
+            self._building.add(namespace)
+        threading.Thread(
+            target=self._build, args=(namespace, version), daemon=True
+        ).start()
+
+    def _build(self, namespace: str, version: str):
+        try:
+            started = time.perf_counter()
+            built_at = time.monotonic()
+            ids = self.remote.list_ids(namespace, self.max_vectors + 1)
+            if len(ids) > self.max_vectors:
+                entry = (version, None, None, built_at)
+                print(f"[DEBUG] Namespace {namespace} stays remote (> {self.max_vectors} vectors)")
+            else:
+                vectors = self.remote.fetch(namespace, ids)
+                ids = [vector_id for vector_id in ids if vector_id in vectors]
+                matrix = np.zeros((len(ids), VECTOR_DIMENSION), dtype=np.float32)
+                for row, vector_id in enumerate(ids):
+                    matrix[row] = vectors[vector_id]
+                matrix = _normalize(matrix)
+                entry = (version, ids, matrix, built_at)
+                print(
+                    f"[DEBUG] Namespace {namespace} served in-process: {len(ids)} vectors, "
+                    f"built in {(time.perf_counter() - started) * 1000:.0f}ms"
+                )
+            with self._lock:
+                self._matrices[namespace] = entry
+        except Exception as e:
+            print(f"[WARN] Could not build in-process vectors for {namespace}: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(namespace)
+
+    def delete(self, namespace: str, ids: List[str]):
+        self.remote.delete(namespace, ids)
+        self._changed(namespace)
+
+    def delete_namespace(self, namespace: str):
+        self.remote.delete_namespace(namespace)
+        self._changed(namespace)
+
+    def namespace_stats(self) -> dict:
+        return self.remote.namespace_stats()
+
+    def list_ids(self, namespace: str, limit: int) -> List[str]:
+        return self.remote.list_ids(namespace, limit)
+
+    def fetch(self, namespace: str, ids: List[str]) -> Dict[str, List[float]]:
+        return self.remote.fetch(namespace, ids)
+
+    def tier_stats(self) -> dict:
+        with self._lock:
+            entries = list(self._matrices.values())
+        in_process = [entry for entry in entries if entry[1] is not None]
+        return {
+            "in_process_namespaces": len(in_process),
+            "in_process_vectors": sum(len(entry[1]) for entry in in_process),
+            "in_process_bytes": sum(entry[2].nbytes for entry in in_process),
+            "remote_namespaces": len(entries) - len(in_process),
+        }
+
+
+def _build_vector_store() -> VectorStore:
+    backend = settings.VECTOR_STORE.lower()
+    if backend == "local":
+        return LocalVectorStore(settings.LOCAL_VECTOR_DIR)
+    if backend != "pinecone":
+        print(f"[WARN] Unknown VECTOR_STORE '{settings.VECTOR_STORE}', using pinecone")
+    remote = PineconeVectorStore(settings.PINECONE_INDEX_NAME, os.getenv("PINECONE_API_KEY"))
+    if settings.SMALL_BOT_MAX_CHUNKS <= 0:
+        return remote
+    return TieredVectorStore(
+        remote,
+        settings.SMALL_BOT_MAX_CHUNKS,
+        settings.IN_PROCESS_VECTORS_MAX_BYTES,
+        settings.IN_PROCESS_VECTORS_TTL,
+    )
+
+
+def get_vector_store() -> VectorStore:
+    """The configured backend (VECTOR_STORE=pinecone|local), shared per process"""
+    return get_client(("vector_store", settings.VECTOR_STORE), _build_vector_store)